@@ -1,25 +1,330 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
 from pathlib import Path
 import subprocess
 import os
 from app.database import get_db
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi.responses import JSONResponse, ORJSONResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from app.auth import get_current_user
 from app import models
 from app.services.mcp_server import call_mcp_models, get_mcp_server
+from app.services.http_client import http_session
 from app.services.form_api_generator import generate_form_api
 import os
 import json
 import re
 import requests
 import logging
+import time
+import itertools
+import string
+import hashlib
+import threading
+import uuid
+from collections import deque
+from functools import lru_cache
+from types import MappingProxyType
+
+# google-re2 gives linear-time matching for the prompt patterns (no catastrophic
+# backtracking on user-supplied prompts); fall back to the stdlib engine without it
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+# orjson serializes the nested component trees in prompt responses (e.g. generated
+# modals) and the full-file fix_code in debug responses in C; use the stdlib
+# encoder when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_JSON_RESPONSE_CLASS = ORJSONResponse if orjson is not None else JSONResponse
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so existing handlers still apply
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+def _json_dumps_indented(value) -> str:
+    """Pretty-print a value for an LLM prompt (2-space indent)"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_INDENT_2).decode()
+        except TypeError:
+            # Non-str keys, oversized ints, etc. - let the stdlib encoder handle them
+            pass
+    return json.dumps(value, indent=2)
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/ai", tags=["ai"])
 
+# Style prompt patterns, grouped per CSS property. Order matters: the first pattern
+# in each list that matches wins, so more specific phrasings come first.
+# Action verbs: make, set, change, color, update, modify, turn, switch, apply, use, give, put, paint, fill
+# Named colors understood in style prompts, mapped to their hex values
+_COLOR_MAP = MappingProxyType({
+    'red': '#ff0000', 'blue': '#0000ff', 'green': '#008000',
+    'yellow': '#ffff00', 'orange': '#ffa500', 'purple': '#800080',
+    'pink': '#ffc0cb', 'black': '#000000', 'white': '#ffffff',
+    'gray': '#808080', 'grey': '#808080', 'brown': '#a52a2a',
+    'cyan': '#00ffff', 'magenta': '#ff00ff', 'lime': '#00ff00',
+    'navy': '#000080', 'teal': '#008080', 'olive': '#808000',
+    'maroon': '#800000', 'silver': '#c0c0c0', 'gold': '#ffd700',
+    'aqua': '#00ffff', 'fuchsia': '#ff00ff'
+})
+
+# The basic named colors understood in hover/state CSS prompts (matched lowercase)
+_HOVER_COLOR_MAP = MappingProxyType({
+    name: _COLOR_MAP[name]
+    for name in ('red', 'blue', 'green', 'yellow', 'orange', 'purple', 'pink', 'black', 'white', 'gray', 'grey')
+})
+
+# Any named color as a whole word (matched against the lowercased prompt)
+_COLOR_NAME_RE = re.compile(r'\b(' + '|'.join(map(re.escape, _COLOR_MAP)) + r')\b')
+
+_BG_COLOR_PATTERNS = [
+    # Pattern 1: "change background to blue", "make background blue", "set background to blue", "turn background blue"
+    r'(?:make|set|change|color|update|modify|turn|switch|apply|use|give|put|paint|fill|make\s+it|set\s+it|change\s+it).{0,60}?(?:background|bg|background-color|backgroundcolor|back\s*ground).{0,60}?(?:to|as|is|=|into|like)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
+    # Pattern 2: "background to blue", "background blue", "bg blue" (without action verb)
+    r'(?:background|bg|background-color|backgroundcolor|back\s*ground).{0,60}?(?:to|as|is|=|into|like)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
+    # Pattern 3: "background blue", "bg blue" (without "to")
+    r'(?:background|bg|background-color|backgroundcolor|back\s*ground)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
+    # Pattern 4: "blue background", "red bg" (color before background)
+    r'([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))\s+(?:background|bg|background-color|backgroundcolor|back\s*ground)',
+    # Pattern 5: "make it blue", "set it to blue" (when context suggests background)
+    r'(?:make|set|change|turn|switch|apply|use|give|put|paint|fill)\s+(?:it|the\s+background|the\s+bg|this).{0,60}?(?:to|as|is|=|into|like)?\s*([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
+    # Pattern 6: "blue it", "make blue" (very casual)
+    r'(?:make|set|change|turn|switch|apply|use|give|put|paint|fill)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
+    # Pattern 7: Just a color word when background context is clear
+    r'\b(?:background|bg)\b.{0,60}?\b([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))\b',
+]
+
+_TEXT_COLOR_PATTERNS = [
+    r'(?:make|set|change|color|update|modify|turn|switch|apply|use|give|put|paint).{0,60}?(?:text|font|foreground|text-color|font-color|text\s*color|font\s*color).{0,60}?(?:to|as|is|=|into|like)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
+    r'(?:text|font|foreground|text-color|font-color|text\s*color|font\s*color).{0,60}?(?:to|as|is|=|into|like)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
+    r'(?:text|font|foreground|text-color|font-color|text\s*color|font\s*color)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
+    r'([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))\s+(?:text|font|foreground|text-color|font-color|text\s*color|font\s*color)',
+]
+
+_WIDTH_PATTERNS = [
+    r'(?:make|set|change|update|modify|make\s+it|set\s+it|change\s+it).{0,60}?(?:width|w|wide).{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem|vh|vw)?',
+    r'(?:width|w|wide).{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem|vh|vw)?',
+    r'(?:width|w|wide)\s+(\d+)\s*(px|%|em|rem|vh|vw)?',
+    r'(\d+)\s*(px|%|em|rem|vh|vw)?\s+(?:width|w|wide)',
+]
+
+_HEIGHT_PATTERNS = [
+    r'(?:make|set|change|update|modify|make\s+it|set\s+it|change\s+it).{0,60}?(?:height|h|tall).{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem|vh|vw)?',
+    r'(?:height|h|tall).{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem|vh|vw)?',
+    r'(?:height|h|tall)\s+(\d+)\s*(px|%|em|rem|vh|vw)?',
+    r'(\d+)\s*(px|%|em|rem|vh|vw)?\s+(?:height|h|tall)',
+]
+
+_FONT_SIZE_PATTERNS = [
+    r'(?:make|set|change|update|modify).{0,60}?(?:font|text).{0,60}?(?:size|bigger|smaller|larger).{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
+    r'(?:font|text).{0,60}?(?:size|bigger|smaller|larger).{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
+    r'(?:font|text)\s+size.{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
+    r'font\s+size\s+(\d+)\s*(px|%|em|rem)?',
+    r'(\d+)\s*(px|%|em|rem)?\s+font',
+]
+
+_PADDING_PATTERNS = [
+    r'(?:add|set|change|update|modify|make|give|put|apply).{0,60}?padding.{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
+    r'padding.{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
+    r'padding\s+(\d+)\s*(px|%|em|rem)?',
+    r'(\d+)\s*(px|%|em|rem)?\s+padding',
+    r'add\s+(\d+)\s*(px|%|em|rem)?\s+padding',
+]
+
+_MARGIN_PATTERNS = [
+    r'(?:add|set|change|update|modify|make|give|put|apply).{0,60}?margin.{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
+    r'margin.{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
+    r'margin\s+(\d+)\s*(px|%|em|rem)?',
+    r'(\d+)\s*(px|%|em|rem)?\s+margin',
+    r'add\s+(\d+)\s*(px|%|em|rem)?\s+margin',
+]
+
+_BORDER_RADIUS_PATTERNS = [
+    r'(?:make|set|change|update|modify|add|give).{0,60}?(?:border.{0,60}?radius|rounded|round|roundness).{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
+    r'(?:border.{0,60}?radius|rounded|round|roundness).{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
+    r'(?:border.{0,60}?radius|rounded|round|roundness)\s+(\d+)\s*(px|%|em|rem)?',
+    r'(\d+)\s*(px|%|em|rem)?\s+(?:border.{0,60}?radius|rounded|round|roundness)',
+    r'round.{0,60}?(\d+)\s*(px|%|em|rem)?',
+]
+
+def _compile_prompt_re(pattern: str) -> re.Pattern:
+    """Compile a pattern run against user prompts with re2 when available, else re"""
+    if re2 is not None:
+        try:
+            return re2.compile(pattern)
+        except re2.error as e:
+            logger.debug(f"re2 could not compile pattern, using re: {e}")
+    return re.compile(pattern)
+
+def _fuse_patterns(patterns: List[str]) -> re.Pattern:
+    """
+    Compile an ordered list of patterns into a single regex.
+    Each pattern becomes a named alternative behind a lazy scan, so one match() call
+    returns the first pattern (in list order) that matches anywhere in the text -
+    the same result as calling re.search() on each pattern in turn.
+    """
+    alternatives = [f"(?s:.*?)(?P<p{idx}>{pattern})" for idx, pattern in enumerate(patterns)]
+    # Inline (?i) instead of re.IGNORECASE so the same source compiles under re2
+    return _compile_prompt_re("(?i)" + "|".join(alternatives))
+
+def _fused_groups(fused: re.Pattern, text: str) -> Optional[tuple]:
+    """
+    Run a fused pattern and return the capture groups of the alternative that matched,
+    or None if no alternative matched.
+    """
+    match = fused.match(text)
+    if not match:
+        return None
+    # The winning alternative's wrapper group closes last, so lastindex points at it
+    start = match.lastindex
+    end = min((idx for idx in fused.groupindex.values() if idx > start), default=fused.groups + 1)
+    return match.groups()[start:end - 1]
+
+_BG_COLOR_RE = _fuse_patterns(_BG_COLOR_PATTERNS)
+_TEXT_COLOR_RE = _fuse_patterns(_TEXT_COLOR_PATTERNS)
+_WIDTH_RE = _fuse_patterns(_WIDTH_PATTERNS)
+_HEIGHT_RE = _fuse_patterns(_HEIGHT_PATTERNS)
+_FONT_SIZE_RE = _fuse_patterns(_FONT_SIZE_PATTERNS)
+_PADDING_RE = _fuse_patterns(_PADDING_PATTERNS)
+_MARGIN_RE = _fuse_patterns(_MARGIN_PATTERNS)
+_BORDER_RADIUS_RE = _fuse_patterns(_BORDER_RADIUS_PATTERNS)
+
+# Literals at least one of which must appear in the lowercased prompt for a property's
+# patterns to be able to match at all. A plain substring test is far cheaper than the
+# regex, so properties the prompt never mentions are skipped without running it.
+_STYLE_HINTS = {
+    'backgroundColor': ('bg', 'back', 'make', 'set', 'change', 'turn', 'switch', 'apply', 'use', 'give', 'put', 'paint', 'fill'),
+    'color': ('text', 'font', 'foreground'),
+    'width': ('w',),
+    'height': ('h', 'tall'),
+    'fontSize': ('font', 'text'),
+    'padding': ('padding',),
+    'margin': ('margin',),
+    'borderRadius': ('round', 'radius'),
+}
+
+# Size and spacing properties: (CSS property, fused pattern); all of them need a number
+_SIZE_STYLE_RULES = [
+    ('width', _WIDTH_RE),
+    ('height', _HEIGHT_RE),
+    ('fontSize', _FONT_SIZE_RE),
+    ('padding', _PADDING_RE),
+    ('margin', _MARGIN_RE),
+    ('borderRadius', _BORDER_RADIUS_RE),
+]
+
+def _has_hint(lower_prompt: str, css_property: str) -> bool:
+    """Cheap substring pre-check: can this property's patterns possibly match?"""
+    return any(hint in lower_prompt for hint in _STYLE_HINTS[css_property])
+
+# Words at least one of which a prompt without digits needs for process_prompt_with_llm_logic
+# to derive any style (sizes, opacity and borders all need a number): the color hints, the
+# alignment/layout/weight keywords and the named colors used by the fallback
+_CSS_KEYWORDS = frozenset({
+    *_STYLE_HINTS['backgroundColor'], *_STYLE_HINTS['color'],
+    'center', 'centre', 'middle', 'align', 'items', 'space', 'spread',
+    'flex', 'block', 'inline', 'grid', 'direction', 'layout', 'weight',
+    *_COLOR_MAP,
+})
+
+# Display keywords after an action verb: (display value, pattern), in priority order
+_DISPLAY_RULES = [
+    ('flex', r'(?:make|set|change|turn|switch|use|apply).{0,60}?(?:flex|flexbox)'),
+    ('block', r'(?:make|set|change|turn|switch|use|apply).{0,60}?(?:block)'),
+    ('inline', r'(?:make|set|change|turn|switch|use|apply).{0,60}?(?:inline)'),
+    ('grid', r'(?:make|set|change|turn|switch|use|apply).{0,60}?(?:grid)'),
+]
+# The patterns have no capture groups, so lastindex - 1 is the winning rule's index
+_DISPLAY_RE = _fuse_patterns([pattern for _, pattern in _DISPLAY_RULES])
+
+# Centering requests, for both screen and component centering; every pattern needs one
+# of _CENTER_HINTS, so prompts without them skip the regex entirely
+_CENTER_PATTERNS = [
+    # Screen/page centering
+    r'(?:center|centre|middle).{0,60}?(?:content|content.{0,60}?screen|screen|page|element|div|it|this)',
+    r'(?:content|content.{0,60}?screen|screen|page|element|div|it|this).{0,60}?(?:center|centre|middle)',
+    r'(?:make|set|put|place|position).{0,60}?(?:content|it|this|element).{0,60}?(?:center|centre|middle).{0,60}?(?:screen|page)',
+    r'(?:make|set|put|place|position).{0,60}?(?:center|centre|middle).{0,60}?(?:content|it|this|element).{0,60}?(?:screen|page)',
+    r'center.{0,60}?of.{0,60}?screen',
+    r'center.{0,60}?on.{0,60}?screen',
+    r'center.{0,60}?the.{0,60}?screen',
+    # Component/child centering patterns - very comprehensive
+    r'(?:inside|inner|child|children|content).{0,60}?(?:component|element|div|it|this|item).{0,60}?(?:should|must|need).{0,60}?(?:be|is).{0,60}?(?:center|centre|middle)',
+    r'(?:inside|inner|child|children|content).{0,60}?(?:component|element|div|it|this|item).{0,60}?(?:should|must|need).{0,60}?(?:be|is).{0,60}?(?:center|centre|middle).{0,60}?(?:of|in).{0,60}?(?:this|the).{0,60}?(?:component|element|div|container)',
+    r'(?:inside|inner|child|children|content).{0,60}?(?:component|element|div|it|this|item).{0,60}?(?:center|centre|middle)',
+    r'(?:center|centre|middle).{0,60}?(?:inside|inner|child|children|content).{0,60}?(?:component|element|div|it|this)',
+    r'(?:make|set|put|place|position).{0,60}?(?:inside|inner|child|children|content).{0,60}?(?:center|centre|middle)',
+    r'(?:make|set|put|place|position).{0,60}?(?:center|centre|middle).{0,60}?(?:inside|inner|child|children|content)',
+    r'(?:inside|inner|child|children|content).{0,60}?(?:should|must|need).{0,60}?(?:center|centre|middle)',
+    r'(?:center|centre|middle).{0,60}?(?:of|in).{0,60}?(?:this|the).{0,60}?(?:component|element|div|container)',
+    r'(?:component|element|div|container).{0,60}?(?:should|must|need).{0,60}?(?:center|centre|middle)',
+    r'(?:component|element|div|container).{0,60}?(?:should|must|need).{0,60}?(?:be|is).{0,60}?(?:center|centre|middle)',
+    r'(?:align|position).{0,60}?(?:center|centre|middle)',
+    r'(?:center|centre|middle).{0,60}?(?:align|position)',
+    # Simple centering requests
+    r'center.{0,60}?(?:it|this|content|element|component)',
+    r'(?:it|this|content|element|component).{0,60}?center',
+    r'(?:should|must|need).{0,60}?(?:be|is).{0,60}?center',
+]
+
+_CENTER_HINTS = ('center', 'centre', 'middle')
+_CENTER_RE = _fuse_patterns(_CENTER_PATTERNS)
+_SCREEN_SCOPE_RE = re.compile(r'(?:screen|page|viewport|view)')
+
+# Component type changes: target element type -> keywords that name it
+_TYPE_CHANGES = {
+    'button': ['button', 'btn'],
+    'input': ['input', 'textbox', 'text field', 'textfield'],
+    'textarea': ['textarea', 'text area', 'text box'],
+    'select': ['select', 'dropdown', 'select box'],
+    'a': ['link', 'anchor', 'hyperlink'],
+    'img': ['image', 'img', 'picture'],
+    'h1': ['h1', 'heading 1', 'title'],
+    'h2': ['h2', 'heading 2', 'subtitle'],
+    'h3': ['h3', 'heading 3'],
+    'h4': ['h4', 'heading 4'],
+    'h5': ['h5', 'heading 5'],
+    'h6': ['h6', 'heading 6'],
+    'p': ['paragraph', 'p', 'text'],
+    'span': ['span', 'inline text'],
+    'div': ['div', 'container', 'box'],
+    'section': ['section'],
+    'article': ['article'],
+    'header': ['header'],
+    'footer': ['footer'],
+    'nav': ['nav', 'navbar', 'navigation'],
+    'ul': ['ul', 'list', 'unordered list'],
+    'ol': ['ol', 'ordered list'],
+    'li': ['li', 'list item'],
+    'table': ['table'],
+    'tr': ['tr', 'table row'],
+    'td': ['td', 'table cell'],
+    'th': ['th', 'table header'],
+}
+
+# Inverted index so the prompt's words can be looked up directly
+_KEYWORD_TO_TYPE = {kw: new_type for new_type, kws in _TYPE_CHANGES.items() for kw in kws}
+
+_TYPE_CHANGE_VERBS = ('change', 'convert', 'make', 'set', 'turn', 'switch')
+
+# Words that suggest a wrap/parent request rather than a type change
+_WRAP_GUARD_RE = re.compile(r'(?:parent|wrapper|wrap|enclose|surround|for|around|of|this)')
+
+def _type_change_keywords(words: List[str]) -> set:
+    """Type-change keywords that appear as words (or word pairs) in the tokenized prompt"""
+    grams = set(words)
+    grams.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+    return grams & _KEYWORD_TO_TYPE.keys()
+
 class AIRequest(BaseModel):
     prompt: str
     component_type: Optional[str] = None
@@ -56,8 +361,15 @@ class DebugResponse(BaseModel):
     confidence: float  # Confidence level (0-1)
     needs_confirmation: bool = True
     fix_applied: bool = False  # Whether the fix was actually applied
-    docker_rebuilt: bool = False  # Whether Docker was rebuilt
-    application_url: Optional[str] = None  # Application URL after rebuild
+    docker_rebuilt: bool = False  # Kept for older clients; rebuilds now report via rebuild_job_id
+    application_url: Optional[str] = None  # Kept for older clients; see RebuildStatusResponse
+    rebuild_job_id: Optional[str] = None  # Background Docker rebuild, see /debug-fix/status/{job_id}
+
+class RebuildStatusResponse(BaseModel):
+    status: str  # pending, running, done or failed
+    docker_rebuilt: bool = False  # Whether the rebuild succeeded
+    error: Optional[str] = None  # Tail of the Docker error output if it failed
+    application_url: Optional[str] = None  # Application URL once rebuilt
 
 class AIResponse(BaseModel):
     changes: dict
@@ -90,7 +402,7 @@ def get_available_ollama_models(ollama_url: str = "http://localhost:11434") -> L
     Get list of available Ollama models.
     """
     try:
-        response = requests.get(f"{ollama_url}/api/tags", timeout=5)
+        response = http_session.get(f"{ollama_url}/api/tags", timeout=5)
         if response.status_code == 200:
             data = response.json()
             models = [model.get("name", "") for model in data.get("models", [])]
@@ -99,7 +411,7 @@ def get_available_ollama_models(ollama_url: str = "http://localhost:11434") -> L
         logger.warning(f"Could not fetch Ollama models: {e}")
     return []
 
-def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-coder") -> Optional[str]:
+def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-coder", model_override: Optional[str] = None) -> Optional[str]:
     """
     Call Ollama LLM API running locally.
     Default model is DeepSeek Coder for better code understanding and CSS/UI modifications.
@@ -112,6 +424,9 @@ def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-c
     1. deepseek-coder:6.7b - Best for understanding component structure and CSS
     2. qwen2.5-coder:7b - Excellent for UI/UX modifications
     3. mistral:7b - Fast and good for simple modifications
+    
+    model_override, when given, takes precedence over the configured OLLAMA_MODEL
+    (used to route simple requests to a smaller model).
     """
     # Check if MCP is enabled
     from app.services.settings_loader import get_mcp_enabled, get_mcp_strategy
@@ -127,9 +442,9 @@ def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-c
         logger.warning("MCP consensus failed, falling back to single model")
     
     # Single model fallback (original behavior)
-    from app.services.settings_loader import get_ollama_url, get_ollama_model, get_ollama_timeout
+    from app.services.settings_loader import get_ollama_url, get_ollama_model, get_ollama_timeout, get_ollama_keep_alive
     ollama_url = get_ollama_url()
-    ollama_model = get_ollama_model() or model
+    ollama_model = model_override or get_ollama_model() or model
     
     try:
         payload = {
@@ -147,13 +462,18 @@ def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-c
         if system_prompt:
             payload["system"] = system_prompt
         
+        # Keep the model (and its cached prompt prefix) loaded between requests
+        keep_alive = get_ollama_keep_alive()
+        if keep_alive:
+            payload["keep_alive"] = keep_alive
+        
         # Use longer timeout for large requests
         timeout = get_ollama_timeout()  # Default 2 minutes, configurable
         estimated_size = len(prompt) + (len(system_prompt) if system_prompt else 0)
         if estimated_size > 5000:
             timeout = max(timeout, 300)  # At least 5 minutes for large requests
         
-        response = requests.post(
+        response = http_session.post(
             f"{ollama_url}/api/generate",
             json=payload,
             timeout=timeout
@@ -294,7 +614,7 @@ def parse_llm_response_extended(llm_output: str) -> dict:
     json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', cleaned_output, re.DOTALL)
     if json_match:
         try:
-            parsed = json.loads(json_match.group())
+            parsed = _json_loads(json_match.group())
             if isinstance(parsed, dict):
                 changes = parsed
         except json.JSONDecodeError:
@@ -303,7 +623,7 @@ def parse_llm_response_extended(llm_output: str) -> dict:
                 # Remove trailing commas
                 fixed_json = re.sub(r',\s*}', '}', json_match.group())
                 fixed_json = re.sub(r',\s*]', ']', fixed_json)
-                parsed = json.loads(fixed_json)
+                parsed = _json_loads(fixed_json)
                 if isinstance(parsed, dict):
                     changes = parsed
             except:
@@ -354,8 +674,13 @@ def generate_intelligent_guess(prompt: str, component_type: Optional[str] = None
     Generate an intelligent guess about what the user wants based on the prompt.
     Returns a rephrased version of the request that the system can understand.
     """
-    lower_prompt = prompt.lower().strip()
-    
+    # The guess only depends on the normalized prompt, so prompts differing in case or
+    # surrounding whitespace share one cache entry
+    return _guess_for_prompt(prompt.lower().strip())
+
+@lru_cache(maxsize=2048)
+def _guess_for_prompt(lower_prompt: str) -> Optional[str]:
+    """Keyword-based guess for a lowercased, stripped prompt; pure, so cached"""
     # Extract key words and patterns
     keywords = {
         'center': ['center', 'centre', 'middle', 'align', 'position'],
@@ -506,47 +831,31 @@ def process_prompt_with_llm_logic_extended(prompt: str, component_type: Optional
         css_properties = []
         
         # Width detection
-        width_match = re.search(r'width.*?(\d+)\s*(px|%|em|rem|vh|vw)?', lower_prompt, re.IGNORECASE)
+        width_match = re.search(r'width.{0,60}?(\d+)\s*(px|%|em|rem|vh|vw)?', lower_prompt)
         if width_match:
             value = width_match.group(1)
             unit = width_match.group(2) if width_match.lastindex >= 2 and width_match.group(2) else 'px'
             css_properties.append(f"  width: {value}{unit};")
         
         # Height detection
-        height_match = re.search(r'height.*?(\d+)\s*(px|%|em|rem|vh|vw)?', lower_prompt, re.IGNORECASE)
+        height_match = re.search(r'height.{0,60}?(\d+)\s*(px|%|em|rem|vh|vw)?', lower_prompt)
         if height_match:
             value = height_match.group(1)
             unit = height_match.group(2) if height_match.lastindex >= 2 and height_match.group(2) else 'px'
             css_properties.append(f"  height: {value}{unit};")
         
         # Background color detection
-        bg_match = re.search(r'background.*?(?:to|as|is|=|into|like)?\s*([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))', lower_prompt, re.IGNORECASE)
+        bg_match = re.search(r'background.{0,60}?(?:to|as|is|=|into|like)?\s*([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))', lower_prompt)
         if bg_match:
             color = bg_match.group(1).strip()
-            color_map = {
-                'red': '#ff0000', 'blue': '#0000ff', 'green': '#008000',
-                'yellow': '#ffff00', 'orange': '#ffa500', 'purple': '#800080',
-                'pink': '#ffc0cb', 'black': '#000000', 'white': '#ffffff',
-                'gray': '#808080', 'grey': '#808080'
-            }
-            color_lower = color.lower()
-            if color_lower in color_map:
-                color = color_map[color_lower]
+            color = _HOVER_COLOR_MAP.get(color, color)
             css_properties.append(f"  background-color: {color};")
         
         # Text color detection
-        color_match = re.search(r'(?:text|color|font-color).*?(?:to|as|is|=|into|like)?\s*([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))', lower_prompt, re.IGNORECASE)
+        color_match = re.search(r'(?:text|color|font-color).{0,60}?(?:to|as|is|=|into|like)?\s*([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))', lower_prompt)
         if color_match:
             color = color_match.group(1).strip()
-            color_map = {
-                'red': '#ff0000', 'blue': '#0000ff', 'green': '#008000',
-                'yellow': '#ffff00', 'orange': '#ffa500', 'purple': '#800080',
-                'pink': '#ffc0cb', 'black': '#000000', 'white': '#ffffff',
-                'gray': '#808080', 'grey': '#808080'
-            }
-            color_lower = color.lower()
-            if color_lower in color_map:
-                color = color_map[color_lower]
+            color = _HOVER_COLOR_MAP.get(color, color)
             css_properties.append(f"  color: {color};")
         
         # If we found any CSS properties, create customCSS
@@ -569,20 +878,62 @@ def process_prompt_with_llm_logic_extended(prompt: str, component_type: Optional
     
     return changes
 
+# Props set from a quoted value in the prompt: (prop, patterns in priority order)
+_QUOTED_PROP_PATTERNS = [
+    # Content/text changes
+    ('children', [
+        r'(?:change|set|update|modify).{0,60}?(?:text|content|value|label).{0,60}?(?:to|as|is|=)\s*["\']([^"\']+)["\']',
+        r'(?:text|content|value|label).{0,60}?(?:to|as|is|=)\s*["\']([^"\']+)["\']',
+        r'(?:set|change|update).{0,60}?["\']([^"\']+)["\']',
+        r'text\s+["\']([^"\']+)["\']',
+    ]),
+    # Placeholder changes (for inputs)
+    ('placeholder', [
+        r'(?:placeholder|hint).{0,60}?(?:to|as|is|=)\s*["\']([^"\']+)["\']',
+    ]),
+    # href changes (for links)
+    ('href', [
+        r'(?:href|link|url).{0,60}?(?:to|as|is|=)\s*["\']([^"\']+)["\']',
+        r'(?:link|url).{0,60}?["\']([^"\']+)["\']',
+    ]),
+    # src changes (for images)
+    ('src', [
+        r'(?:src|source|image).{0,60}?(?:to|as|is|=)\s*["\']([^"\']+)["\']',
+    ]),
+    # alt text changes (for images)
+    ('alt', [
+        r'(?:alt|alternative).{0,60}?(?:to|as|is|=)\s*["\']([^"\']+)["\']',
+    ]),
+    # className changes
+    ('className', [
+        r'(?:class|className).{0,60}?(?:to|as|is|=)\s*["\']([^"\']+)["\']',
+        r'(?:add|set).{0,60}?class.{0,60}?["\']([^"\']+)["\']',
+    ]),
+    # id changes
+    ('id', [
+        r'(?:id).{0,60}?(?:to|as|is|=)\s*["\']([^"\']+)["\']',
+    ]),
+]
+_QUOTED_PROP_RULES = [(prop_name, _fuse_patterns(patterns)) for prop_name, patterns in _QUOTED_PROP_PATTERNS]
+
 def process_html_component_changes(prompt: str, component_type: Optional[str] = None, current_props: Optional[dict] = None) -> dict:
     """
     Process prompts to modify HTML component properties (type, content, attributes).
     Also handles modal creation, onClick handlers, and parent/wrapping requests.
     """
     changes = {}
+    props = {}  # attached to changes on the way out, only if something was set
     lower_prompt = prompt.lower().strip()
+    # Tokenize once: \w+ splits exactly where \b does, so a whole-word check is a set lookup
+    words = re.findall(r'\w+', lower_prompt)
+    tokens = set(words)
     
     # Parent/wrap requests - check BEFORE type changes to avoid confusion
     parent_wrap_patterns = [
-        r'(?:create|add|make|put).*?(?:parent|wrapper|container).*?(?:tag|element|component).*?(?:for|around|of|this)',
-        r'(?:wrap|enclose|surround).*?(?:in|with|inside).*?(?:tag|element|component)',
-        r'(?:create|add|make).*?(?:parent|wrapper).*?(?:main|div|section|article|header|footer|nav|aside)',
-        r'(?:put|place|move).*?(?:inside|into|within).*?(?:main|div|section|article|header|footer|nav|aside)',
+        r'(?:create|add|make|put).{0,60}?(?:parent|wrapper|container).{0,60}?(?:tag|element|component).{0,60}?(?:for|around|of|this)',
+        r'(?:wrap|enclose|surround).{0,60}?(?:in|with|inside).{0,60}?(?:tag|element|component)',
+        r'(?:create|add|make).{0,60}?(?:parent|wrapper).{0,60}?(?:main|div|section|article|header|footer|nav|aside)',
+        r'(?:put|place|move).{0,60}?(?:inside|into|within).{0,60}?(?:main|div|section|article|header|footer|nav|aside)',
     ]
     
     is_parent_request = False
@@ -590,12 +941,12 @@ def process_html_component_changes(prompt: str, component_type: Optional[str] =
     
     # Check if this is a parent/wrap request
     for pattern in parent_wrap_patterns:
-        if re.search(pattern, lower_prompt, re.IGNORECASE):
+        if re.search(pattern, lower_prompt):
             is_parent_request = True
             # Extract the parent tag type
             parent_tags = ['main', 'div', 'section', 'article', 'header', 'footer', 'nav', 'aside', 'form']
             for tag in parent_tags:
-                if re.search(rf'\b{tag}\b', lower_prompt, re.IGNORECASE):
+                if tag in tokens:
                     parent_type = tag
                     break
             # Default to 'main' if no specific tag mentioned
@@ -610,15 +961,15 @@ def process_html_component_changes(prompt: str, component_type: Optional[str] =
     
     # Modal creation requests
     modal_patterns = [
-        r'(?:open|show|create|add).*?modal.*?(?:with|having|containing|that has)',
-        r'(?:when|on).*?(?:click|press).*?(?:open|show|display).*?modal',
-        r'modal.*?(?:with|having|containing|that has)',
-        r'(?:click|press).*?(?:this|the).*?(?:button|element).*?(?:open|show|display).*?modal',
+        r'(?:open|show|create|add).{0,60}?modal.{0,60}?(?:with|having|containing|that has)',
+        r'(?:when|on).{0,60}?(?:click|press).{0,60}?(?:open|show|display).{0,60}?modal',
+        r'modal.{0,60}?(?:with|having|containing|that has)',
+        r'(?:click|press).{0,60}?(?:this|the).{0,60}?(?:button|element).{0,60}?(?:open|show|display).{0,60}?modal',
     ]
     
     is_modal_request = False
     for pattern in modal_patterns:
-        if re.search(pattern, lower_prompt, re.IGNORECASE):
+        if re.search(pattern, lower_prompt):
             is_modal_request = True
             break
     
@@ -627,287 +978,195 @@ def process_html_component_changes(prompt: str, component_type: Optional[str] =
         modal_fields = []
         
         # Look for quote number
-        if re.search(r'quote.*?number|number.*?quote', lower_prompt, re.IGNORECASE):
+        if re.search(r'quote.{0,60}?number|number.{0,60}?quote', lower_prompt):
             modal_fields.append({'name': 'quoteNumber', 'label': 'Quote Number', 'type': 'input'})
         
         # Look for description
-        if re.search(r'description', lower_prompt, re.IGNORECASE):
+        if re.search(r'description', lower_prompt):
             modal_fields.append({'name': 'description', 'label': 'Description', 'type': 'textarea'})
         
         # Look for other common fields
-        if re.search(r'name|title', lower_prompt, re.IGNORECASE):
+        if re.search(r'name|title', lower_prompt):
             modal_fields.append({'name': 'name', 'label': 'Name', 'type': 'input'})
         
-        if re.search(r'email', lower_prompt, re.IGNORECASE):
+        if re.search(r'email', lower_prompt):
             modal_fields.append({'name': 'email', 'label': 'Email', 'type': 'input'})
         
         # Create modal component structure
-        import time
-        modal_id = f"modal-{int(time.time() * 1000)}"
+        modal_id = _next_component_id("modal")
         
         # Generate modal component structure (ComponentNode format)
         modal_component = generate_modal_component(modal_id, modal_fields)
         
-        # Add onClick handler to open modal
-        if 'props' not in changes:
-            changes['props'] = {}
-        
         # Create onClick handler code that shows the modal
         onClick_code = f"document.getElementById('{modal_id}').style.display = 'flex';"
-        changes['props']['onClick'] = onClick_code
+        props['onClick'] = onClick_code
         
         # Add modal component to be created (as ComponentNode structure)
         changes['create_modal'] = modal_component
     
-    # Component type changes
-    type_changes = {
-        'button': ['button', 'btn'],
-        'input': ['input', 'textbox', 'text field', 'textfield'],
-        'textarea': ['textarea', 'text area', 'text box'],
-        'select': ['select', 'dropdown', 'select box'],
-        'a': ['link', 'anchor', 'hyperlink'],
-        'img': ['image', 'img', 'picture'],
-        'h1': ['h1', 'heading 1', 'title'],
-        'h2': ['h2', 'heading 2', 'subtitle'],
-        'h3': ['h3', 'heading 3'],
-        'h4': ['h4', 'heading 4'],
-        'h5': ['h5', 'heading 5'],
-        'h6': ['h6', 'heading 6'],
-        'p': ['paragraph', 'p', 'text'],
-        'span': ['span', 'inline text'],
-        'div': ['div', 'container', 'box'],
-        'section': ['section'],
-        'article': ['article'],
-        'header': ['header'],
-        'footer': ['footer'],
-        'nav': ['nav', 'navbar', 'navigation'],
-        'ul': ['ul', 'list', 'unordered list'],
-        'ol': ['ol', 'ordered list'],
-        'li': ['li', 'list item'],
-        'table': ['table'],
-        'tr': ['tr', 'table row'],
-        'td': ['td', 'table cell'],
-        'th': ['th', 'table header'],
-    }
-    
-    for new_type, keywords in type_changes.items():
-        for keyword in keywords:
-            # More specific patterns to avoid false positives with wrap/parent requests
-            if re.search(rf'\b(?:change|convert|make|set|turn|switch).*?(?:to|into|as).*?\b{keyword}\b', lower_prompt, re.IGNORECASE) or \
-               (re.search(rf'\b(?:make|set|change|convert|turn|switch).*?\b{keyword}\b', lower_prompt, re.IGNORECASE) and \
-                not re.search(r'(?:parent|wrapper|wrap|enclose|surround|for|around|of|this)', lower_prompt, re.IGNORECASE)):
-                changes['type'] = new_type
+    # Component type changes - only keywords that actually occur are tried,
+    # in _TYPE_CHANGES order so the first listed type still wins
+    if any(verb in lower_prompt for verb in _TYPE_CHANGE_VERBS):
+        mentioned = _type_change_keywords(words)
+        mentions_wrap = bool(mentioned) and bool(_WRAP_GUARD_RE.search(lower_prompt))
+        for new_type, keywords in _TYPE_CHANGES.items():
+            for keyword in keywords:
+                if keyword not in mentioned:
+                    continue
+                # More specific patterns to avoid false positives with wrap/parent requests
+                if re.search(rf'\b(?:change|convert|make|set|turn|switch).{{0,60}}?(?:to|into|as).{{0,60}}?\b{keyword}\b', lower_prompt) or \
+                   (not mentions_wrap and re.search(rf'\b(?:make|set|change|convert|turn|switch).{{0,60}}?\b{keyword}\b', lower_prompt)):
+                    changes['type'] = new_type
+                    break
+            if 'type' in changes:
                 break
-        if 'type' in changes:
-            break
-    
-    # Content/text changes
-    text_patterns = [
-        r'(?:change|set|update|modify).*?(?:text|content|value|label).*?(?:to|as|is|=)\s*["\']([^"\']+)["\']',
-        r'(?:text|content|value|label).*?(?:to|as|is|=)\s*["\']([^"\']+)["\']',
-        r'(?:set|change|update).*?["\']([^"\']+)["\']',
-        r'text\s+["\']([^"\']+)["\']',
-    ]
-    
-    for pattern in text_patterns:
-        match = re.search(pattern, prompt, re.IGNORECASE)
-        if match:
-            if 'props' not in changes:
-                changes['props'] = {}
-            changes['props']['children'] = match.group(1)
-            break
-    
-    # Placeholder changes (for inputs)
-    placeholder_match = re.search(r'(?:placeholder|hint).*?(?:to|as|is|=)\s*["\']([^"\']+)["\']', prompt, re.IGNORECASE)
-    if placeholder_match:
-        if 'props' not in changes:
-            changes['props'] = {}
-        changes['props']['placeholder'] = placeholder_match.group(1)
-    
-    # href changes (for links)
-    href_patterns = [
-        r'(?:href|link|url).*?(?:to|as|is|=)\s*["\']([^"\']+)["\']',
-        r'(?:link|url).*?["\']([^"\']+)["\']',
-    ]
-    for pattern in href_patterns:
-        match = re.search(pattern, prompt, re.IGNORECASE)
-        if match:
-            if 'props' not in changes:
-                changes['props'] = {}
-            changes['props']['href'] = match.group(1)
-            break
-    
-    # src changes (for images)
-    src_match = re.search(r'(?:src|source|image).*?(?:to|as|is|=)\s*["\']([^"\']+)["\']', prompt, re.IGNORECASE)
-    if src_match:
-        if 'props' not in changes:
-            changes['props'] = {}
-        changes['props']['src'] = src_match.group(1)
     
-    # alt text changes (for images)
-    alt_match = re.search(r'(?:alt|alternative).*?(?:to|as|is|=)\s*["\']([^"\']+)["\']', prompt, re.IGNORECASE)
-    if alt_match:
-        if 'props' not in changes:
-            changes['props'] = {}
-        changes['props']['alt'] = alt_match.group(1)
-    
-    # className changes
-    class_patterns = [
-        r'(?:class|className).*?(?:to|as|is|=)\s*["\']([^"\']+)["\']',
-        r'(?:add|set).*?class.*?["\']([^"\']+)["\']',
-    ]
-    for pattern in class_patterns:
-        match = re.search(pattern, prompt, re.IGNORECASE)
-        if match:
-            if 'props' not in changes:
-                changes['props'] = {}
-            changes['props']['className'] = match.group(1)
-            break
-    
-    # id changes
-    id_match = re.search(r'(?:id).*?(?:to|as|is|=)\s*["\']([^"\']+)["\']', prompt, re.IGNORECASE)
-    if id_match:
-        if 'props' not in changes:
-            changes['props'] = {}
-        changes['props']['id'] = id_match.group(1)
+    # Quoted prop values (text, placeholder, href, src, alt, className, id) - every
+    # pattern needs a quoted value, so prompts without quotes skip them all
+    if '"' in prompt or "'" in prompt:
+        for prop_name, fused in _QUOTED_PROP_RULES:
+            match = _fused_groups(fused, prompt)
+            if match:
+                props[prop_name] = match[0]
     
     # type attribute changes (for inputs, buttons)
-    input_type_match = re.search(r'(?:input\s+type|type).*?(?:to|as|is|=)\s*["\']?(\w+)["\']?', prompt, re.IGNORECASE)
+    input_type_match = re.search(r'(?:input\s+type|type).{0,60}?(?:to|as|is|=)\s*["\']?(\w+)["\']?', prompt, re.IGNORECASE)
     if input_type_match:
-        if 'props' not in changes:
-            changes['props'] = {}
-        changes['props']['type'] = input_type_match.group(1)
+        props['type'] = input_type_match.group(1)
     
     # disabled/enabled changes
-    if re.search(r'\b(?:disable|disabled)\b', lower_prompt, re.IGNORECASE):
-        if 'props' not in changes:
-            changes['props'] = {}
-        changes['props']['disabled'] = True
-    elif re.search(r'\b(?:enable|enabled)\b', lower_prompt, re.IGNORECASE):
-        if 'props' not in changes:
-            changes['props'] = {}
-        changes['props']['disabled'] = False
+    if 'disable' in tokens or 'disabled' in tokens:
+        props['disabled'] = True
+    elif 'enable' in tokens or 'enabled' in tokens:
+        props['disabled'] = False
     
     # required attribute
-    if re.search(r'\b(?:require|required|mandatory)\b', lower_prompt, re.IGNORECASE):
-        if 'props' not in changes:
-            changes['props'] = {}
-        changes['props']['required'] = True
+    if 'require' in tokens or 'required' in tokens or 'mandatory' in tokens:
+        props['required'] = True
     
+    if props:
+        changes['props'] = props
     return changes
 
+# Styles for the generated modal component. These are shared by every modal
+# built by generate_modal_component, so treat them as read-only.
+_MODAL_OVERLAY_STYLE = {
+    'display': 'none',
+    'position': 'fixed',
+    'top': '0',
+    'left': '0',
+    'width': '100%',
+    'height': '100%',
+    'background': 'rgba(0, 0, 0, 0.5)',
+    'zIndex': '1000',
+    'alignItems': 'center',
+    'justifyContent': 'center'
+}
+_MODAL_CONTENT_STYLE = {
+    'background': 'white',
+    'padding': '2rem',
+    'borderRadius': '8px',
+    'maxWidth': '500px',
+    'width': '90%',
+    'maxHeight': '90vh',
+    'overflowY': 'auto',
+    'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)'
+}
+_HEADER_STYLE = {'display': 'flex', 'justifyContent': 'space-between', 'alignItems': 'center', 'marginBottom': '1.5rem'}
+_TITLE_STYLE = {'margin': '0', 'fontSize': '1.5rem'}
+_CLOSE_BTN_STYLE = {'background': 'none', 'border': 'none', 'fontSize': '1.5rem', 'cursor': 'pointer', 'padding': '0.25rem 0.5rem'}
+_FIELD_CONTAINER_STYLE = {'marginBottom': '1rem'}
+_LABEL_STYLE = {'display': 'block', 'marginBottom': '0.5rem', 'fontWeight': '600'}
+_INPUT_STYLE = {'width': '100%', 'padding': '0.5rem', 'border': '1px solid #ddd', 'borderRadius': '4px', 'boxSizing': 'border-box'}
+_TEXTAREA_STYLE = {**_INPUT_STYLE, 'resize': 'vertical'}
+_ACTIONS_STYLE = {'display': 'flex', 'gap': '0.5rem', 'justifyContent': 'flex-end', 'marginTop': '1.5rem'}
+_CANCEL_BTN_STYLE = {'padding': '0.5rem 1rem', 'border': '1px solid #ddd', 'background': 'white', 'borderRadius': '4px', 'cursor': 'pointer'}
+_SUBMIT_BTN_STYLE = {'padding': '0.5rem 1rem', 'border': 'none', 'background': '#667eea', 'color': 'white', 'borderRadius': '4px', 'cursor': 'pointer'}
+
+_ID_COUNTER = itertools.count()
+
+def _next_component_id(prefix: str) -> str:
+    """Unique id for generated components (wall-clock ns plus a per-process counter)"""
+    return f"{prefix}-{time.time_ns():x}-{next(_ID_COUNTER):x}"
+
+def _modal_input_control(field_id: str, field: dict) -> dict:
+    return {
+        'type': 'input',
+        'id': f"{field_id}-input",
+        'props': {'type': 'text', 'id': field['name'], 'name': field['name'], 'style': _INPUT_STYLE}
+    }
+
+def _modal_textarea_control(field_id: str, field: dict) -> dict:
+    return {
+        'type': 'textarea',
+        'id': f"{field_id}-textarea",
+        'props': {'id': field['name'], 'name': field['name'], 'rows': 4, 'style': _TEXTAREA_STYLE}
+    }
+
+# Modal form field type -> builder for its control; other field types are skipped
+_MODAL_FIELD_CONTROLS = {
+    'input': _modal_input_control,
+    'textarea': _modal_textarea_control,
+}
+
+def _modal_field_component(field_id: str, field: dict) -> dict:
+    """Labelled input/textarea block for one modal form field"""
+    return {
+        'type': 'div',
+        'id': f"{field_id}-container",
+        'props': {
+            'style': _FIELD_CONTAINER_STYLE,
+            'children': [
+                {
+                    'type': 'label',
+                    'id': f"{field_id}-label",
+                    'props': {'style': _LABEL_STYLE, 'children': field['label']}
+                },
+                _MODAL_FIELD_CONTROLS[field['type']](field_id, field)
+            ]
+        }
+    }
+
 def generate_modal_component(modal_id: str, fields: list) -> dict:
     """
     Generate ComponentNode structure for a modal with the specified fields.
     """
-    import time
-    base_id = f"comp-{int(time.time() * 1000)}"
+    base_id = _next_component_id("comp")
     
     # Create field components
-    field_components = []
-    for idx, field in enumerate(fields):
-        field_id = f"{base_id}-field-{idx}"
-        if field['type'] == 'input':
-            field_components.append({
-                'type': 'div',
-                'id': f"{field_id}-container",
-                'props': {
-                    'style': {'marginBottom': '1rem'},
-                    'children': [
-                        {
-                            'type': 'label',
-                            'id': f"{field_id}-label",
-                            'props': {
-                                'style': {'display': 'block', 'marginBottom': '0.5rem', 'fontWeight': '600'},
-                                'children': field['label']
-                            }
-                        },
-                        {
-                            'type': 'input',
-                            'id': f"{field_id}-input",
-                            'props': {
-                                'type': 'text',
-                                'id': field['name'],
-                                'name': field['name'],
-                                'style': {'width': '100%', 'padding': '0.5rem', 'border': '1px solid #ddd', 'borderRadius': '4px', 'boxSizing': 'border-box'}
-                            }
-                        }
-                    ]
-                }
-            })
-        elif field['type'] == 'textarea':
-            field_components.append({
-                'type': 'div',
-                'id': f"{field_id}-container",
-                'props': {
-                    'style': {'marginBottom': '1rem'},
-                    'children': [
-                        {
-                            'type': 'label',
-                            'id': f"{field_id}-label",
-                            'props': {
-                                'style': {'display': 'block', 'marginBottom': '0.5rem', 'fontWeight': '600'},
-                                'children': field['label']
-                            }
-                        },
-                        {
-                            'type': 'textarea',
-                            'id': f"{field_id}-textarea",
-                            'props': {
-                                'id': field['name'],
-                                'name': field['name'],
-                                'rows': 4,
-                                'style': {'width': '100%', 'padding': '0.5rem', 'border': '1px solid #ddd', 'borderRadius': '4px', 'boxSizing': 'border-box', 'resize': 'vertical'}
-                            }
-                        }
-                    ]
-                }
-            })
+    field_components = [
+        _modal_field_component(f"{base_id}-field-{idx}", field)
+        for idx, field in enumerate(fields)
+        if field['type'] in _MODAL_FIELD_CONTROLS
+    ]
+    
+    close_modal = f"document.getElementById('{modal_id}').style.display = 'none';"
     
     # Create modal component structure
     modal_component = {
         'type': 'div',
         'id': modal_id,
         'props': {
-            'style': {
-                'display': 'none',
-                'position': 'fixed',
-                'top': '0',
-                'left': '0',
-                'width': '100%',
-                'height': '100%',
-                'background': 'rgba(0, 0, 0, 0.5)',
-                'zIndex': '1000',
-                'alignItems': 'center',
-                'justifyContent': 'center'
-            },
+            'style': _MODAL_OVERLAY_STYLE,
             'children': [
                 {
                     'type': 'div',
                     'id': f"{base_id}-content",
                     'props': {
-                        'style': {
-                            'background': 'white',
-                            'padding': '2rem',
-                            'borderRadius': '8px',
-                            'maxWidth': '500px',
-                            'width': '90%',
-                            'maxHeight': '90vh',
-                            'overflowY': 'auto',
-                            'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)'
-                        },
+                        'style': _MODAL_CONTENT_STYLE,
                         'children': [
                             {
                                 'type': 'div',
                                 'id': f"{base_id}-header",
                                 'props': {
-                                    'style': {'display': 'flex', 'justifyContent': 'space-between', 'alignItems': 'center', 'marginBottom': '1.5rem'},
+                                    'style': _HEADER_STYLE,
                                     'children': [
                                         {
                                             'type': 'h2',
                                             'id': f"{base_id}-title",
                                             'props': {
-                                                'style': {'margin': '0', 'fontSize': '1.5rem'},
+                                                'style': _TITLE_STYLE,
                                                 'children': 'Modal'
                                             }
                                         },
@@ -915,8 +1174,8 @@ def generate_modal_component(modal_id: str, fields: list) -> dict:
                                             'type': 'button',
                                             'id': f"{base_id}-close",
                                             'props': {
-                                                'onClick': f"document.getElementById('{modal_id}').style.display = 'none';",
-                                                'style': {'background': 'none', 'border': 'none', 'fontSize': '1.5rem', 'cursor': 'pointer', 'padding': '0.25rem 0.5rem'},
+                                                'onClick': close_modal,
+                                                'style': _CLOSE_BTN_STYLE,
                                                 'children': '×'
                                             }
                                         }
@@ -932,15 +1191,15 @@ def generate_modal_component(modal_id: str, fields: list) -> dict:
                                             'type': 'div',
                                             'id': f"{base_id}-actions",
                                             'props': {
-                                                'style': {'display': 'flex', 'gap': '0.5rem', 'justifyContent': 'flex-end', 'marginTop': '1.5rem'},
+                                                'style': _ACTIONS_STYLE,
                                                 'children': [
                                                     {
                                                         'type': 'button',
                                                         'id': f"{base_id}-cancel",
                                                         'props': {
                                                             'type': 'button',
-                                                            'onClick': f"document.getElementById('{modal_id}').style.display = 'none';",
-                                                            'style': {'padding': '0.5rem 1rem', 'border': '1px solid #ddd', 'background': 'white', 'borderRadius': '4px', 'cursor': 'pointer'},
+                                                            'onClick': close_modal,
+                                                            'style': _CANCEL_BTN_STYLE,
                                                             'children': 'Cancel'
                                                         }
                                                     },
@@ -949,7 +1208,7 @@ def generate_modal_component(modal_id: str, fields: list) -> dict:
                                                         'id': f"{base_id}-submit",
                                                         'props': {
                                                             'type': 'submit',
-                                                            'style': {'padding': '0.5rem 1rem', 'border': 'none', 'background': '#667eea', 'color': 'white', 'borderRadius': '4px', 'cursor': 'pointer'},
+                                                            'style': _SUBMIT_BTN_STYLE,
                                                             'children': 'Submit'
                                                         }
                                                     }
@@ -968,263 +1227,195 @@ def generate_modal_component(modal_id: str, fields: list) -> dict:
     
     return modal_component
 
+# Compiled once for process_prompt_with_llm_logic / process_ai_prompt; the keyword
+# checks run against the lowercased prompt, so they need no IGNORECASE. The ones with
+# bounded lazy gaps go through re2 (see _compile_prompt_re)
+_CENTER_WORD_RE = re.compile(r'(?:center|centre|middle)')
+_TEXT_ALIGN_CONTEXT_RE = re.compile(r'(?:text|align|content|center)')
+_LEFT_RE = re.compile(r'(?:left)')
+_RIGHT_RE = re.compile(r'(?:right)')
+_SIDE_ALIGN_CONTEXT_RE = re.compile(r'(?:text|align)')
+_CENTER_TEXT_RE = re.compile(r'center\s+(?:the\s+)?(?:text|content)')
+_NESTED_CONTEXT_RE = _compile_prompt_re(r'(?:inside|inner|child|children|content|of|in).{0,60}?(?:component|element|div|this|the)')
+_JUSTIFY_CONTEXT_RE = re.compile(r'(?:content|items|justify|align)')
+_SPACE_BETWEEN_RE = _compile_prompt_re(r'(?:space.{0,60}?between|spread)')
+_SPACE_AROUND_RE = _compile_prompt_re(r'(?:space.{0,60}?around)')
+_CENTER_CONTENT_RE = re.compile(r'center\s+(?:content|items)')
+_ALIGN_ITEMS_CONTEXT_RE = _compile_prompt_re(r'(?:items|align.{0,60}?items|vertical)')
+_START_RE = re.compile(r'(?:start|top)')
+_END_RE = re.compile(r'(?:end|bottom)')
+_ITEMS_CONTEXT_RE = re.compile(r'(?:items|align)')
+# Fused like the size patterns: one match() returns the first pattern that matches.
+# ("<word> <number>" needs no pattern of its own - the gap pattern already covers it)
+_OPACITY_RE = _fuse_patterns([
+    r'(?:make|set|change|update|modify).{0,60}?(?:opacity|transparent|transparency|see.{0,60}?through).{0,60}?(?:to|as|is|=|into)?\s*(\d+(?:\.\d+)?)',
+    r'(?:opacity|transparent|transparency).{0,60}?(?:to|as|is|=|into)?\s*(\d+(?:\.\d+)?)',
+])
+_FONT_WEIGHT_WORDS = ('bold', 'heavy', 'thick', 'strong', 'normal', 'regular', 'standard', 'light', 'thin')
+_BOLD_RE = re.compile(r'(?:bold|heavy|thick|strong)')
+_NORMAL_WEIGHT_RE = re.compile(r'(?:normal|regular|standard)')
+_LIGHT_WEIGHT_RE = re.compile(r'(?:light|thin|lighter)')
+_FONT_CONTEXT_RE = re.compile(r'(?:font|text|weight)')
+_MAKE_BOLD_RE = _compile_prompt_re(r'make.{0,60}?bold')
+_BORDER_RE = _fuse_patterns([
+    r'(?:add|set|change|update|modify|make|give|put|apply).{0,60}?(?:border|outline|edge).{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px)?\s*([a-z]+|#[0-9a-f]{3,6})?',
+    r'(?:border|outline|edge).{0,60}?(?:to|as|is|=|into)?\s*(\d+)\s*(px)?\s*([a-z]+|#[0-9a-f]{3,6})?',
+    r'(\d+)\s*(px)?\s*(?:border|outline|edge)',
+])
+_BG_CONTEXT_RE = re.compile(r'(?:background|bg|back)')
+_TEXT_CONTEXT_RE = re.compile(r'(?:text|font|foreground)')
+
+def _apply_opacity(prompt: str, lower_prompt: str, changes: dict) -> None:
+    """Opacity - more patterns; percentages above 1 are scaled down to 0-1"""
+    match = _fused_groups(_OPACITY_RE, lower_prompt)
+    if match:
+        value = float(match[0])
+        changes['opacity'] = str(value / 100 if value > 1 else value)
+
+def _apply_font_weight(prompt: str, lower_prompt: str, changes: dict) -> None:
+    """Font weight - more patterns"""
+    # "bold ... text" always has a font context, and "make ... bold" always contains
+    # "bold", so the font-context probe is the only one shared between branches
+    has_font_context = _FONT_CONTEXT_RE.search(lower_prompt) is not None
+    if _BOLD_RE.search(lower_prompt) and (has_font_context or _MAKE_BOLD_RE.search(lower_prompt)):
+        changes['fontWeight'] = 'bold'
+    elif has_font_context:
+        if _NORMAL_WEIGHT_RE.search(lower_prompt):
+            changes['fontWeight'] = 'normal'
+        elif _LIGHT_WEIGHT_RE.search(lower_prompt):
+            changes['fontWeight'] = '300'
+
+def _apply_border(prompt: str, lower_prompt: str, changes: dict) -> None:
+    """Border - more patterns (matched on the original prompt to keep the color's case)"""
+    match = _fused_groups(_BORDER_RE, prompt)
+    if match:
+        width = match[0] or '1'
+        color = match[2] if len(match) >= 3 and match[2] else '#000000'
+        changes['border'] = f"{width}px solid {color}"
+
+# (trigger words, needs a number, handler): a handler can only match when the prompt
+# contains one of its trigger words (and a digit, if flagged), so the rest are skipped
+_STYLE_HANDLERS = (
+    (('opacity', 'transparen', 'through'), True, _apply_opacity),
+    (_FONT_WEIGHT_WORDS, False, _apply_font_weight),
+    (('border', 'outline', 'edge'), True, _apply_border),
+)
+
+# Prompts clear enough to auto-apply the guessed change without asking for confirmation:
+# "<verb> <property>...", "make it blue", "set this 20px", or a bare style keyword
+_CLEAR_VERBS = frozenset({'make', 'set', 'change', 'update', 'add', 'remove', 'delete', 'clear'})
+_CLEAR_PROPERTIES = ('background', 'bg', 'color', 'text', 'font', 'size', 'width', 'height', 'padding', 'margin', 'border', 'opacity', 'display', 'position')
+_CLEAR_PREFIXES = ('center', 'align', 'justify', 'flex', 'grid',
+                   'bold', 'italic', 'underline', 'hidden', 'visible', 'block', 'inline', 'none')
+_CLEAR_VALUE_RE = re.compile(r'^(?:make|set)\s+(?:it|this|component)\s+(?:(?:blue|red|green|yellow|black|white|gray|grey|transparent)|\d+\s*(?:px|rem|em|%))')
+
+def _is_clear_prompt(prompt_lower: str) -> bool:
+    """Is this (lowercased, stripped) prompt specific enough to apply without confirmation?"""
+    if prompt_lower.startswith(_CLEAR_PREFIXES):
+        return True
+    words = prompt_lower.split(None, 1)
+    if len(words) == 2 and words[0] in _CLEAR_VERBS and words[1].startswith(_CLEAR_PROPERTIES):
+        return True
+    return _CLEAR_VALUE_RE.match(prompt_lower) is not None
+
+# Example phrasings offered when a prompt can't be understood: (keywords, suggestions)
+_SUGGESTION_RULES = (
+    (('center', 'centre', 'middle', 'align'), (
+        "• \"center content\" or \"center inside component\"",
+        "• \"center on screen\" or \"center the page\"",
+    )),
+    (('color', 'background', 'bg'), ("• \"make background blue\" or \"change background to red\"",)),
+    (('text', 'font', 'content'), ("• \"change text to 'Hello'\" or \"make text bold\"",)),
+    (('size', 'width', 'height', 'big', 'small'), ("• \"set width to 500px\" or \"make it bigger\"",)),
+    (('button', 'link', 'input'), ("• \"convert to button\" or \"make it a link\"",)),
+)
+
+# Space before every capital: camelCase property names -> readable labels
+_CAMEL_SPACE_TABLE = str.maketrans({letter: f' {letter}' for letter in string.ascii_uppercase})
+
+@lru_cache(maxsize=1024)
+def _format_change_key(key: str) -> str:
+    """Readable label for a changed style/prop key (backgroundColor -> Background Color)"""
+    formatted_key = key.translate(_CAMEL_SPACE_TABLE).strip()
+    return formatted_key[0].upper() + formatted_key[1:] if formatted_key else key
+
 def process_prompt_with_llm_logic(prompt: str, component_type: Optional[str] = None, current_styles: Optional[dict] = None) -> dict:
     """
     Enhanced prompt processing for CSS styles only.
     This is called by process_prompt_with_llm_logic_extended for style changes.
     """
+    # The only thing the extraction reads from current_styles is whether a height is
+    # already set, so that flag (with the prompt) is the whole cache key
+    has_explicit_height = bool(current_styles) and ('height' in current_styles or 'minHeight' in current_styles)
+    # Copy so callers can mutate the result without touching the cached entry
+    return dict(_style_changes_for_prompt(prompt, has_explicit_height))
+
+@lru_cache(maxsize=4096)
+def _style_changes_for_prompt(prompt: str, has_explicit_height: bool) -> dict:
+    """Pattern-based style extraction; pure, so results are cached per prompt"""
     changes = {}
     lower_prompt = prompt.lower().strip()
     original_prompt = prompt
+    has_digit = any(ch.isdigit() for ch in prompt)
     
-    # Color changes with comprehensive pattern matching - handles all phrase variations
-    # Action verbs: make, set, change, color, update, modify, turn, switch, apply, use, give, put, paint, fill
-    # Background patterns - try multiple variations
-    bg_patterns = [
-        # Pattern 1: "change background to blue", "make background blue", "set background to blue", "turn background blue"
-        r'(?:make|set|change|color|update|modify|turn|switch|apply|use|give|put|paint|fill|make\s+it|set\s+it|change\s+it).*?(?:background|bg|background-color|backgroundcolor|back\s*ground).*?(?:to|as|is|=|into|like)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
-        # Pattern 2: "background to blue", "background blue", "bg blue" (without action verb)
-        r'(?:background|bg|background-color|backgroundcolor|back\s*ground).*?(?:to|as|is|=|into|like)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
-        # Pattern 3: "background blue", "bg blue" (without "to")
-        r'(?:background|bg|background-color|backgroundcolor|back\s*ground)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
-        # Pattern 4: "blue background", "red bg" (color before background)
-        r'([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))\s+(?:background|bg|background-color|backgroundcolor|back\s*ground)',
-        # Pattern 5: "make it blue", "set it to blue" (when context suggests background)
-        r'(?:make|set|change|turn|switch|apply|use|give|put|paint|fill)\s+(?:it|the\s+background|the\s+bg|this).*?(?:to|as|is|=|into|like)?\s*([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
-        # Pattern 6: "blue it", "make blue" (very casual)
-        r'(?:make|set|change|turn|switch|apply|use|give|put|paint|fill)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
-        # Pattern 7: Just a color word when background context is clear
-        r'\b(?:background|bg)\b.*?\b([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))\b',
-    ]
-    
-    bg_match = None
-    for pattern in bg_patterns:
-        bg_match = re.search(pattern, prompt, re.IGNORECASE)
-        if bg_match:
-            break
+    # Nothing below can match without a number or one of these words - skip every regex
+    if not has_digit and not any(word in lower_prompt for word in _CSS_KEYWORDS):
+        return changes
     
+    # Color changes with comprehensive pattern matching - handles all phrase variations
+    # (see _BG_COLOR_PATTERNS / _TEXT_COLOR_PATTERNS for the supported phrasings)
+    bg_match = _fused_groups(_BG_COLOR_RE, prompt) if _has_hint(lower_prompt, 'backgroundColor') else None
     if bg_match:
-        color = bg_match.group(1).strip()
-        color_map = {
-            'red': '#ff0000', 'blue': '#0000ff', 'green': '#008000',
-            'yellow': '#ffff00', 'orange': '#ffa500', 'purple': '#800080',
-            'pink': '#ffc0cb', 'black': '#000000', 'white': '#ffffff',
-            'gray': '#808080', 'grey': '#808080', 'brown': '#a52a2a',
-            'cyan': '#00ffff', 'magenta': '#ff00ff', 'lime': '#00ff00',
-            'navy': '#000080', 'teal': '#008080', 'olive': '#808000',
-            'maroon': '#800000', 'silver': '#c0c0c0', 'gold': '#ffd700',
-            'aqua': '#00ffff', 'fuchsia': '#ff00ff'
-        }
-        color_lower = color.lower()
-        if color_lower in color_map:
-            color = color_map[color_lower]
-        changes['backgroundColor'] = color
+        color = bg_match[0].strip()
+        changes['backgroundColor'] = _COLOR_MAP.get(color.lower(), color)
     
     # Text color patterns - comprehensive variations
-    text_patterns = [
-        r'(?:make|set|change|color|update|modify|turn|switch|apply|use|give|put|paint).*?(?:text|font|foreground|text-color|font-color|text\s*color|font\s*color).*?(?:to|as|is|=|into|like)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
-        r'(?:text|font|foreground|text-color|font-color|text\s*color|font\s*color).*?(?:to|as|is|=|into|like)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
-        r'(?:text|font|foreground|text-color|font-color|text\s*color|font\s*color)\s+([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))',
-        r'([a-z]+|#[0-9a-f]{3,6}|rgb\([^)]+\))\s+(?:text|font|foreground|text-color|font-color|text\s*color|font\s*color)',
-    ]
-    
-    text_match = None
-    for pattern in text_patterns:
-        text_match = re.search(pattern, prompt, re.IGNORECASE)
-        if text_match:
-            break
-    
+    text_match = _fused_groups(_TEXT_COLOR_RE, prompt) if _has_hint(lower_prompt, 'color') else None
     if text_match:
-        color = text_match.group(1).strip()
-        color_map = {
-            'red': '#ff0000', 'blue': '#0000ff', 'green': '#008000',
-            'yellow': '#ffff00', 'orange': '#ffa500', 'purple': '#800080',
-            'pink': '#ffc0cb', 'black': '#000000', 'white': '#ffffff',
-            'gray': '#808080', 'grey': '#808080', 'brown': '#a52a2a',
-            'cyan': '#00ffff', 'magenta': '#ff00ff', 'lime': '#00ff00',
-            'navy': '#000080', 'teal': '#008080', 'olive': '#808000',
-            'maroon': '#800000', 'silver': '#c0c0c0', 'gold': '#ffd700',
-            'aqua': '#00ffff', 'fuchsia': '#ff00ff'
-        }
-        color_lower = color.lower()
-        if color_lower in color_map:
-            color = color_map[color_lower]
-        changes['color'] = color
-    
-    # Size changes - more flexible patterns
-    # Width patterns
-    width_patterns = [
-        r'(?:make|set|change|update|modify|make\s+it|set\s+it|change\s+it).*?(?:width|w|wide).*?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem|vh|vw)?',
-        r'(?:width|w|wide).*?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem|vh|vw)?',
-        r'(?:width|w|wide)\s+(\d+)\s*(px|%|em|rem|vh|vw)?',
-        r'(\d+)\s*(px|%|em|rem|vh|vw)?\s+(?:width|w|wide)',
-    ]
-    for pattern in width_patterns:
-        match = re.search(pattern, prompt, re.IGNORECASE)
+        color = text_match[0].strip()
+        changes['color'] = _COLOR_MAP.get(color.lower(), color)
+    
+    # Size and spacing changes - each fused pattern is a single scan of the prompt
+    for css_property, fused in _SIZE_STYLE_RULES:
+        if not has_digit or not _has_hint(lower_prompt, css_property):
+            continue
+        match = _fused_groups(fused, prompt)
         if match:
-            value = match.group(1)
-            unit = match.group(2) if match.lastindex >= 2 and match.group(2) else 'px'
-            changes['width'] = f"{value}{unit}"
-            break
-    
-    # Height patterns
-    height_patterns = [
-        r'(?:make|set|change|update|modify|make\s+it|set\s+it|change\s+it).*?(?:height|h|tall).*?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem|vh|vw)?',
-        r'(?:height|h|tall).*?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem|vh|vw)?',
-        r'(?:height|h|tall)\s+(\d+)\s*(px|%|em|rem|vh|vw)?',
-        r'(\d+)\s*(px|%|em|rem|vh|vw)?\s+(?:height|h|tall)',
-    ]
-    for pattern in height_patterns:
-        match = re.search(pattern, prompt, re.IGNORECASE)
-        if match:
-            value = match.group(1)
-            unit = match.group(2) if match.lastindex >= 2 and match.group(2) else 'px'
-            changes['height'] = f"{value}{unit}"
-            break
-    
-    # Font size patterns
-    font_size_patterns = [
-        r'(?:make|set|change|update|modify).*?(?:font|text).*?(?:size|bigger|smaller|larger).*?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
-        r'(?:font|text).*?(?:size|bigger|smaller|larger).*?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
-        r'(?:font|text)\s+size.*?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
-        r'font\s+size\s+(\d+)\s*(px|%|em|rem)?',
-        r'(\d+)\s*(px|%|em|rem)?\s+font',
-    ]
-    for pattern in font_size_patterns:
-        match = re.search(pattern, prompt, re.IGNORECASE)
-        if match:
-            value = match.group(1)
-            unit = match.group(2) if match.lastindex >= 2 and match.group(2) else 'px'
-            changes['fontSize'] = f"{value}{unit}"
-            break
-    
-    # Spacing - more flexible patterns
-    # Padding patterns
-    padding_patterns = [
-        r'(?:add|set|change|update|modify|make|give|put|apply).*?padding.*?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
-        r'padding.*?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
-        r'padding\s+(\d+)\s*(px|%|em|rem)?',
-        r'(\d+)\s*(px|%|em|rem)?\s+padding',
-        r'add\s+(\d+)\s*(px|%|em|rem)?\s+padding',
-    ]
-    for pattern in padding_patterns:
-        match = re.search(pattern, prompt, re.IGNORECASE)
-        if match:
-            value = match.group(1)
-            unit = match.group(2) if match.lastindex >= 2 and match.group(2) else 'px'
-            changes['padding'] = f"{value}{unit}"
-            break
-    
-    # Margin patterns
-    margin_patterns = [
-        r'(?:add|set|change|update|modify|make|give|put|apply).*?margin.*?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
-        r'margin.*?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
-        r'margin\s+(\d+)\s*(px|%|em|rem)?',
-        r'(\d+)\s*(px|%|em|rem)?\s+margin',
-        r'add\s+(\d+)\s*(px|%|em|rem)?\s+margin',
-    ]
-    for pattern in margin_patterns:
-        match = re.search(pattern, prompt, re.IGNORECASE)
-        if match:
-            value = match.group(1)
-            unit = match.group(2) if match.lastindex >= 2 and match.group(2) else 'px'
-            changes['margin'] = f"{value}{unit}"
-            break
-    
-    # Border radius - more patterns
-    border_radius_patterns = [
-        r'(?:make|set|change|update|modify|add|give).*?(?:border.*?radius|rounded|round|roundness).*?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
-        r'(?:border.*?radius|rounded|round|roundness).*?(?:to|as|is|=|into)?\s*(\d+)\s*(px|%|em|rem)?',
-        r'(?:border.*?radius|rounded|round|roundness)\s+(\d+)\s*(px|%|em|rem)?',
-        r'(\d+)\s*(px|%|em|rem)?\s+(?:border.*?radius|rounded|round|roundness)',
-        r'round.*?(\d+)\s*(px|%|em|rem)?',
-    ]
-    for pattern in border_radius_patterns:
-        match = re.search(pattern, prompt, re.IGNORECASE)
-        if match:
-            value = match.group(1)
-            unit = match.group(2) if match.lastindex >= 2 and match.group(2) else 'px'
-            changes['borderRadius'] = f"{value}{unit}"
-            break
+            value, unit = match
+            changes[css_property] = f"{value}{unit or 'px'}"
     
     # Text alignment - more patterns
-    if (re.search(r'(?:center|centre|middle)', prompt, re.IGNORECASE) and 
-        (re.search(r'(?:text|align|content)', prompt, re.IGNORECASE) or 
-         re.search(r'(?:align|text|center)', prompt, re.IGNORECASE) or
-         re.search(r'center\s+(?:it|text|content)', prompt, re.IGNORECASE))):
+    if _CENTER_WORD_RE.search(lower_prompt) and _TEXT_ALIGN_CONTEXT_RE.search(lower_prompt):
         changes['textAlign'] = 'center'
-    elif (re.search(r'(?:left)', prompt, re.IGNORECASE) and 
-          re.search(r'(?:text|align)', prompt, re.IGNORECASE)):
+    elif _LEFT_RE.search(lower_prompt) and _SIDE_ALIGN_CONTEXT_RE.search(lower_prompt):
         changes['textAlign'] = 'left'
-    elif (re.search(r'(?:right)', prompt, re.IGNORECASE) and 
-          re.search(r'(?:text|align)', prompt, re.IGNORECASE)):
+    elif _RIGHT_RE.search(lower_prompt) and _SIDE_ALIGN_CONTEXT_RE.search(lower_prompt):
         changes['textAlign'] = 'right'
-    elif re.search(r'center\s+(?:the\s+)?(?:text|content)', prompt, re.IGNORECASE):
+    elif _CENTER_TEXT_RE.search(lower_prompt):
         changes['textAlign'] = 'center'
     
-    # Display - more patterns
-    if re.search(r'(?:make|set|change|turn|switch|use|apply).*?(?:flex|flexbox)', prompt, re.IGNORECASE):
-        changes['display'] = 'flex'
-    elif re.search(r'(?:make|set|change|turn|switch|use|apply).*?(?:block)', prompt, re.IGNORECASE):
-        changes['display'] = 'block'
-    elif re.search(r'(?:make|set|change|turn|switch|use|apply).*?(?:inline)', prompt, re.IGNORECASE):
-        changes['display'] = 'inline'
-    elif re.search(r'(?:make|set|change|turn|switch|use|apply).*?(?:grid)', prompt, re.IGNORECASE):
-        changes['display'] = 'grid'
-    elif re.search(r'(?:flex|flexbox)', prompt, re.IGNORECASE) and re.search(r'(?:display|layout)', prompt, re.IGNORECASE):
+    # Display - one fused scan, earlier values in _DISPLAY_RULES win
+    display_match = _DISPLAY_RE.match(prompt)
+    if display_match:
+        changes['display'] = _DISPLAY_RULES[display_match.lastindex - 1][0]
+    elif 'flex' in lower_prompt and ('display' in lower_prompt or 'layout' in lower_prompt):
         changes['display'] = 'flex'
     
-    # Flex direction - more patterns
-    if (re.search(r'(?:column|vertical|stack)', prompt, re.IGNORECASE) and 
-        re.search(r'(?:flex|direction|layout)', prompt, re.IGNORECASE)):
-        changes['flexDirection'] = 'column'
-    elif (re.search(r'(?:row|horizontal|side)', prompt, re.IGNORECASE) and 
-          re.search(r'(?:flex|direction|layout)', prompt, re.IGNORECASE)):
-        changes['flexDirection'] = 'row'
-    elif re.search(r'flex.*?column', prompt, re.IGNORECASE):
-        changes['flexDirection'] = 'column'
-    elif re.search(r'flex.*?row', prompt, re.IGNORECASE):
-        changes['flexDirection'] = 'row'
-    
-    # Centering content - comprehensive patterns (handles both screen and component centering)
-    center_patterns = [
-        # Screen/page centering
-        r'(?:center|centre|middle).*?(?:content|content.*?screen|screen|page|element|div|it|this)',
-        r'(?:content|content.*?screen|screen|page|element|div|it|this).*?(?:center|centre|middle)',
-        r'(?:make|set|put|place|position).*?(?:content|it|this|element).*?(?:center|centre|middle).*?(?:screen|page)',
-        r'(?:make|set|put|place|position).*?(?:center|centre|middle).*?(?:content|it|this|element).*?(?:screen|page)',
-        r'center.*?of.*?screen',
-        r'center.*?on.*?screen',
-        r'center.*?the.*?screen',
-        # Component/child centering patterns - very comprehensive
-        r'(?:inside|inner|child|children|content).*?(?:component|element|div|it|this|item).*?(?:should|must|need).*?(?:be|is).*?(?:center|centre|middle)',
-        r'(?:inside|inner|child|children|content).*?(?:component|element|div|it|this|item).*?(?:should|must|need).*?(?:be|is).*?(?:center|centre|middle).*?(?:of|in).*?(?:this|the).*?(?:component|element|div|container)',
-        r'(?:inside|inner|child|children|content).*?(?:component|element|div|it|this|item).*?(?:center|centre|middle)',
-        r'(?:center|centre|middle).*?(?:inside|inner|child|children|content).*?(?:component|element|div|it|this)',
-        r'(?:make|set|put|place|position).*?(?:inside|inner|child|children|content).*?(?:center|centre|middle)',
-        r'(?:make|set|put|place|position).*?(?:center|centre|middle).*?(?:inside|inner|child|children|content)',
-        r'(?:inside|inner|child|children|content).*?(?:should|must|need).*?(?:center|centre|middle)',
-        r'(?:center|centre|middle).*?(?:of|in).*?(?:this|the).*?(?:component|element|div|container)',
-        r'(?:component|element|div|container).*?(?:should|must|need).*?(?:center|centre|middle)',
-        r'(?:component|element|div|container).*?(?:should|must|need).*?(?:be|is).*?(?:center|centre|middle)',
-        r'(?:align|position).*?(?:center|centre|middle)',
-        r'(?:center|centre|middle).*?(?:align|position)',
-        # Simple centering requests
-        r'center.*?(?:it|this|content|element|component)',
-        r'(?:it|this|content|element|component).*?center',
-        r'(?:should|must|need).*?(?:be|is).*?center',
-    ]
+    # Flex direction - only in a flex/direction/layout context; column wins over row
+    if any(word in lower_prompt for word in ('flex', 'direction', 'layout')):
+        if any(word in lower_prompt for word in ('column', 'vertical', 'stack')):
+            changes['flexDirection'] = 'column'
+        elif any(word in lower_prompt for word in ('row', 'horizontal', 'side')):
+            changes['flexDirection'] = 'row'
     
+    # Centering content - see _CENTER_PATTERNS (handles both screen and component centering)
     is_centering_request = False
     is_screen_centering = False
-    for pattern in center_patterns:
-        match = re.search(pattern, prompt, re.IGNORECASE)
-        if match:
-            is_centering_request = True
-            # Check if it's screen/page centering
-            if re.search(r'(?:screen|page|viewport|view)', prompt, re.IGNORECASE):
-                is_screen_centering = True
-            break
+    if any(hint in lower_prompt for hint in _CENTER_HINTS) and _CENTER_RE.match(prompt):
+        is_centering_request = True
+        # Check if it's screen/page centering
+        if _SCREEN_SCOPE_RE.search(lower_prompt):
+            is_screen_centering = True
     
     if is_centering_request:
         # For centering content, use flexbox
@@ -1236,131 +1427,57 @@ def process_prompt_with_llm_logic(prompt: str, component_type: Optional[str] = N
             changes['minHeight'] = '100vh'
             changes['height'] = '100vh'
         # For component centering (inside another component), ensure it has some height to center within
-        elif re.search(r'(?:inside|inner|child|children|content|of|in).*?(?:component|element|div|this|the)', prompt, re.IGNORECASE):
+        elif _NESTED_CONTEXT_RE.search(lower_prompt):
             # If no height is set, add min-height to allow centering
-            if not current_styles or ('height' not in current_styles and 'minHeight' not in current_styles):
+            if not has_explicit_height:
                 changes['minHeight'] = '100%'
     
     # Justify content - more patterns (for horizontal alignment only)
     if not is_centering_request:
-        if (re.search(r'(?:center|centre|middle)', prompt, re.IGNORECASE) and 
-            re.search(r'(?:content|items|justify|align)', prompt, re.IGNORECASE)):
+        if _CENTER_WORD_RE.search(lower_prompt) and _JUSTIFY_CONTEXT_RE.search(lower_prompt):
             changes['justifyContent'] = 'center'
-        elif re.search(r'(?:space.*?between|spread)', prompt, re.IGNORECASE):
+        elif _SPACE_BETWEEN_RE.search(lower_prompt):
             changes['justifyContent'] = 'space-between'
-        elif re.search(r'(?:space.*?around)', prompt, re.IGNORECASE):
+        elif _SPACE_AROUND_RE.search(lower_prompt):
             changes['justifyContent'] = 'space-around'
-        elif re.search(r'center\s+(?:content|items)', prompt, re.IGNORECASE):
+        elif _CENTER_CONTENT_RE.search(lower_prompt):
             changes['justifyContent'] = 'center'
     
-    # Align items - for vertical alignment
-    if not is_centering_request:
-        if (re.search(r'(?:center|centre|middle)', prompt, re.IGNORECASE) and 
-            re.search(r'(?:items|align.*?items|vertical)', prompt, re.IGNORECASE)):
+    # Align items - for vertical alignment (every branch needs items/align/vertical)
+    if not is_centering_request and any(word in lower_prompt for word in ('items', 'align', 'vertical')):
+        if _CENTER_WORD_RE.search(lower_prompt) and _ALIGN_ITEMS_CONTEXT_RE.search(lower_prompt):
             changes['alignItems'] = 'center'
-        elif re.search(r'(?:start|top)', prompt, re.IGNORECASE) and re.search(r'(?:items|align)', prompt, re.IGNORECASE):
+        elif _START_RE.search(lower_prompt) and _ITEMS_CONTEXT_RE.search(lower_prompt):
             changes['alignItems'] = 'flex-start'
-        elif re.search(r'(?:end|bottom)', prompt, re.IGNORECASE) and re.search(r'(?:items|align)', prompt, re.IGNORECASE):
+        elif _END_RE.search(lower_prompt) and _ITEMS_CONTEXT_RE.search(lower_prompt):
             changes['alignItems'] = 'flex-end'
     
-    # Opacity - more patterns
-    opacity_patterns = [
-        r'(?:make|set|change|update|modify).*?(?:opacity|transparent|transparency|see.*?through).*?(?:to|as|is|=|into)?\s*(\d+(?:\.\d+)?)',
-        r'(?:opacity|transparent|transparency).*?(?:to|as|is|=|into)?\s*(\d+(?:\.\d+)?)',
-        r'(?:opacity|transparent|transparency)\s+(\d+(?:\.\d+)?)',
-    ]
-    for pattern in opacity_patterns:
-        match = re.search(pattern, prompt, re.IGNORECASE)
-        if match:
-            value = float(match.group(1))
-            changes['opacity'] = str(value / 100 if value > 1 else value)
-            break
-    
-    # Font weight - more patterns
-    if (re.search(r'(?:bold|heavy|thick|strong)', prompt, re.IGNORECASE) and 
-        (re.search(r'(?:font|text|weight)', prompt, re.IGNORECASE) or 
-         re.search(r'make.*?bold', prompt, re.IGNORECASE) or
-         re.search(r'bold.*?text', prompt, re.IGNORECASE))):
-        changes['fontWeight'] = 'bold'
-    elif (re.search(r'(?:normal|regular|standard)', prompt, re.IGNORECASE) and 
-          re.search(r'(?:font|text|weight)', prompt, re.IGNORECASE)):
-        changes['fontWeight'] = 'normal'
-    elif (re.search(r'(?:light|thin|lighter)', prompt, re.IGNORECASE) and 
-          re.search(r'(?:font|text|weight)', prompt, re.IGNORECASE)):
-        changes['fontWeight'] = '300'
-    elif re.search(r'make.*?bold', prompt, re.IGNORECASE):
-        changes['fontWeight'] = 'bold'
-    
-    # Border - more patterns
-    border_patterns = [
-        r'(?:add|set|change|update|modify|make|give|put|apply).*?(?:border|outline|edge).*?(?:to|as|is|=|into)?\s*(\d+)\s*(px)?\s*([a-z]+|#[0-9a-f]{3,6})?',
-        r'(?:border|outline|edge).*?(?:to|as|is|=|into)?\s*(\d+)\s*(px)?\s*([a-z]+|#[0-9a-f]{3,6})?',
-        r'(?:border|outline|edge)\s+(\d+)\s*(px)?\s*([a-z]+|#[0-9a-f]{3,6})?',
-        r'(\d+)\s*(px)?\s*(?:border|outline|edge)',
-    ]
-    for pattern in border_patterns:
-        match = re.search(pattern, prompt, re.IGNORECASE)
-        if match:
-            width = match.group(1) or '1'
-            color = match.group(3) if match.lastindex >= 3 and match.group(3) else '#000000'
-            changes['border'] = f"{width}px solid {color}"
-            break
+    # Opacity, font weight and border - only the handlers whose trigger words appear run
+    for triggers, needs_digit, handler in _STYLE_HANDLERS:
+        if (has_digit or not needs_digit) and any(word in lower_prompt for word in triggers):
+            handler(prompt, lower_prompt, changes)
     
     # Fallback: Try to extract any CSS property mentioned in common phrases
     # This handles cases like "make it bigger", "increase size", etc.
     if not changes:
-        # Try to find any color word in the prompt (if no specific property was matched)
-        color_words = ['red', 'blue', 'green', 'yellow', 'orange', 'purple', 'pink', 'black', 'white', 
-                      'gray', 'grey', 'brown', 'cyan', 'magenta', 'lime', 'navy', 'teal', 'olive',
-                      'maroon', 'silver', 'gold', 'aqua', 'fuchsia']
-        for color_word in color_words:
-            if re.search(rf'\b{color_word}\b', prompt, re.IGNORECASE):
-                # If background context is likely, apply to background
-                if re.search(r'(?:background|bg|back)', prompt, re.IGNORECASE):
-                    color_map = {
-                        'red': '#ff0000', 'blue': '#0000ff', 'green': '#008000',
-                        'yellow': '#ffff00', 'orange': '#ffa500', 'purple': '#800080',
-                        'pink': '#ffc0cb', 'black': '#000000', 'white': '#ffffff',
-                        'gray': '#808080', 'grey': '#808080', 'brown': '#a52a2a',
-                        'cyan': '#00ffff', 'magenta': '#ff00ff', 'lime': '#00ff00',
-                        'navy': '#000080', 'teal': '#008080', 'olive': '#808000',
-                        'maroon': '#800000', 'silver': '#c0c0c0', 'gold': '#ffd700',
-                        'aqua': '#00ffff', 'fuchsia': '#ff00ff'
-                    }
-                    changes['backgroundColor'] = color_map.get(color_word.lower(), f'#{color_word}')
-                    break
-                # If text context is likely, apply to text color
-                elif re.search(r'(?:text|font|foreground)', prompt, re.IGNORECASE):
-                    color_map = {
-                        'red': '#ff0000', 'blue': '#0000ff', 'green': '#008000',
-                        'yellow': '#ffff00', 'orange': '#ffa500', 'purple': '#800080',
-                        'pink': '#ffc0cb', 'black': '#000000', 'white': '#ffffff',
-                        'gray': '#808080', 'grey': '#808080', 'brown': '#a52a2a',
-                        'cyan': '#00ffff', 'magenta': '#ff00ff', 'lime': '#00ff00',
-                        'navy': '#000080', 'teal': '#008080', 'olive': '#808000',
-                        'maroon': '#800000', 'silver': '#c0c0c0', 'gold': '#ffd700',
-                        'aqua': '#00ffff', 'fuchsia': '#ff00ff'
-                    }
-                    changes['color'] = color_map.get(color_word.lower(), f'#{color_word}')
-                    break
-                # Default to background if no context
-                else:
-                    color_map = {
-                        'red': '#ff0000', 'blue': '#0000ff', 'green': '#008000',
-                        'yellow': '#ffff00', 'orange': '#ffa500', 'purple': '#800080',
-                        'pink': '#ffc0cb', 'black': '#000000', 'white': '#ffffff',
-                        'gray': '#808080', 'grey': '#808080', 'brown': '#a52a2a',
-                        'cyan': '#00ffff', 'magenta': '#ff00ff', 'lime': '#00ff00',
-                        'navy': '#000080', 'teal': '#008080', 'olive': '#808000',
-                        'maroon': '#800000', 'silver': '#c0c0c0', 'gold': '#ffd700',
-                        'aqua': '#00ffff', 'fuchsia': '#ff00ff'
-                    }
-                    changes['backgroundColor'] = color_map.get(color_word.lower(), f'#{color_word}')
-                    break
+        # Try to find any color word in the prompt (if no specific property was matched).
+        # One scan collects every color name; the first name in _COLOR_MAP order wins
+        mentioned = set(_COLOR_NAME_RE.findall(lower_prompt))
+        color_word = next((name for name in _COLOR_MAP if name in mentioned), None)
+        if color_word:
+            # Text context applies to the text color; background context or no context
+            # at all applies to the background
+            if not _BG_CONTEXT_RE.search(lower_prompt) and _TEXT_CONTEXT_RE.search(lower_prompt):
+                changes['color'] = _COLOR_MAP[color_word]
+            else:
+                changes['backgroundColor'] = _COLOR_MAP[color_word]
     
     return changes
 
-@router.post("/process-prompt", response_model=AIResponse)
+# Keys of a change set that make it worth applying (empty dicts/strings don't count)
+_MEANINGFUL_CHANGE_KEYS = ('style', 'customCSS', 'type', 'props', 'wrap_in', 'create_modal')
+
+@router.post("/process-prompt", response_model=AIResponse, response_class=_JSON_RESPONSE_CLASS)
 async def process_ai_prompt(
     request: AIRequest,
     current_user: models.User = Depends(get_current_user)
@@ -1370,8 +1487,10 @@ async def process_ai_prompt(
     This endpoint can be integrated with any LLM provider.
     """
     try:
-        # Call LLM (or enhanced pattern matching) and capture raw response
-        changes, raw_llm_response = call_llm(
+        # Call LLM (or enhanced pattern matching) and capture raw response. Both the
+        # Ollama HTTP call and the regex pipeline block, so run them off the event loop
+        changes, raw_llm_response = await run_in_threadpool(
+            call_llm,
             request.prompt,
             request.component_type,
             request.current_styles,
@@ -1383,8 +1502,7 @@ async def process_ai_prompt(
             changes = {}
         
         # Ensure 'style' key exists if there are style changes
-        if 'style' not in changes:
-            changes['style'] = {}
+        changes.setdefault('style', {})
         
         # Critical fix: If justifyContent or alignItems are set, ensure display: flex is also set
         # This is required for flexbox properties to work
@@ -1403,32 +1521,12 @@ async def process_ai_prompt(
                     style['alignItems'] = changes.pop('alignItems')
         
         # Check if changes is empty or has no meaningful content
-        has_changes = False
-        if changes.get('style') and len(changes.get('style', {})) > 0:
-            has_changes = True
-        if changes.get('customCSS'):
-            has_changes = True
-        if changes.get('type'):
-            has_changes = True
-        if changes.get('props') and len(changes.get('props', {})) > 0:
-            has_changes = True
-        if changes.get('wrap_in'):
-            has_changes = True
-        if changes.get('create_modal'):
-            has_changes = True
+        has_changes = any(changes.get(key) for key in _MEANINGFUL_CHANGE_KEYS)
         
         if not has_changes:
             # Check if the prompt is clear enough to auto-apply (don't ask for confirmation)
             prompt_lower = request.prompt.lower().strip()
-            clear_patterns = [
-                r'^(make|set|change|update|add|remove|delete|clear)\s+(background|bg|color|text|font|size|width|height|padding|margin|border|opacity|display|position)',
-                r'^(center|align|justify|flex|grid)',
-                r'^(make|set)\s+(it|this|component)\s+(blue|red|green|yellow|black|white|gray|grey|transparent)',
-                r'^(make|set)\s+(it|this|component)\s+\d+\s*(px|rem|em|%)',
-                r'^(bold|italic|underline|hidden|visible|block|inline|flex|grid|none)'
-            ]
-            
-            is_clear = any(re.match(pattern, prompt_lower) for pattern in clear_patterns)
+            is_clear = _is_clear_prompt(prompt_lower)
             
             # Generate an intelligent guess about what the user wants
             guess = generate_intelligent_guess(request.prompt, request.component_type)
@@ -1457,19 +1555,10 @@ async def process_ai_prompt(
             else:
                 # Fallback to suggestions if no guess can be generated
                 suggestions = []
-                lower_prompt = request.prompt.lower()
                 
-                if any(word in lower_prompt for word in ['center', 'centre', 'middle', 'align']):
-                    suggestions.append("• \"center content\" or \"center inside component\"")
-                    suggestions.append("• \"center on screen\" or \"center the page\"")
-                if any(word in lower_prompt for word in ['color', 'background', 'bg']):
-                    suggestions.append("• \"make background blue\" or \"change background to red\"")
-                if any(word in lower_prompt for word in ['text', 'font', 'content']):
-                    suggestions.append("• \"change text to 'Hello'\" or \"make text bold\"")
-                if any(word in lower_prompt for word in ['size', 'width', 'height', 'big', 'small']):
-                    suggestions.append("• \"set width to 500px\" or \"make it bigger\"")
-                if any(word in lower_prompt for word in ['button', 'link', 'input']):
-                    suggestions.append("• \"convert to button\" or \"make it a link\"")
+                for keywords, hints in _SUGGESTION_RULES:
+                    if any(word in prompt_lower for word in keywords):
+                        suggestions.extend(hints)
                 
                 # Default suggestions if no specific context found
                 if not suggestions:
@@ -1496,8 +1585,7 @@ async def process_ai_prompt(
         if 'style' in changes and changes['style']:
             for key, value in changes['style'].items():
                 # Format CSS property names nicely (convert camelCase to readable)
-                formatted_key = re.sub(r'([A-Z])', r' \1', key).strip()
-                formatted_key = formatted_key[0].upper() + formatted_key[1:] if formatted_key else key
+                formatted_key = _format_change_key(key)
                 changes_list.append(f"• {formatted_key}: {value}")
         if 'type' in changes and changes['type']:
             changes_list.append(f"• Component type changed to: {changes['type']}")
@@ -1505,8 +1593,7 @@ async def process_ai_prompt(
             for key, value in changes['props'].items():
                 # Skip internal props in the message (including children to avoid "New Text" issue)
                 if key not in ['style', 'children']:
-                    formatted_key = re.sub(r'([A-Z])', r' \1', key).strip()
-                    formatted_key = formatted_key[0].upper() + formatted_key[1:] if formatted_key else key
+                    formatted_key = _format_change_key(key)
                     # Truncate long values
                     display_value = str(value)
                     if len(display_value) > 50:
@@ -1532,6 +1619,82 @@ async def process_ai_prompt(
             detail=f"Error processing AI prompt: {str(e)}"
         )
 
+# Cleanup for JSON returned by the LLM in process_action_message
+_MD_FENCE_RE = re.compile(r'```(?:json)?\s*\n?')
+_TRAILING_COMMA_OBJECT_RE = re.compile(r',\s*}')
+_TRAILING_COMMA_ARRAY_RE = re.compile(r',\s*]')
+_SINGLE_QUOTED_KEY_RE = re.compile(r"'(\w+)':")
+_SINGLE_QUOTED_PAIR_RE = re.compile(r'(\w+):\s*\'([^\']*)\'')
+_SINGLE_QUOTED_VALUE_RE = re.compile(r":\s*'([^']*)'")
+# onClick handler inside a JSX/HTML element the LLM returned instead of a bare handler
+_ONCLICK_ATTR_RE = re.compile(r'onClick\s*=\s*["\']?([^"\']+)["\']?', re.IGNORECASE)
+_ONCLICK_JSX_RE = re.compile(r'onClick\s*=\s*\{\{([^}]+)\}\}', re.IGNORECASE)
+_BRACED_EXPR_RE = re.compile(r'\{([^}]+)\}')
+
+def _extract_json_object(text: str) -> Optional[str]:
+    """
+    Outermost {...} span of an LLM reply (first '{' to last '}'), with markdown code
+    fences removed. One find/rfind instead of a greedy regex scan; None if there is none.
+    """
+    if '```' in text:
+        text = _MD_FENCE_RE.sub('', text)
+    start = text.find('{')
+    end = text.rfind('}')
+    if start == -1 or end < start:
+        return None
+    return text[start:end + 1]
+
+_JSON_DECODER = json.JSONDecoder()
+
+def _salvage_json_fields(text: str) -> dict:
+    """
+    Top-level key/value pairs of a JSON object that parse cleanly, in order, stopping at
+    the first one that doesn't - recovers the short leading fields of a reply whose tail
+    (typically a long code string) was cut off. A truncated value is never included.
+    """
+    fields = {}
+    idx = text.find('{')
+    if idx == -1:
+        return fields
+    idx += 1
+    length = len(text)
+    while True:
+        while idx < length and text[idx] in ' \t\r\n,':
+            idx += 1
+        try:
+            key, idx = _JSON_DECODER.raw_decode(text, idx)
+            while idx < length and text[idx] in ' \t\r\n':
+                idx += 1
+            if not isinstance(key, str) or idx >= length or text[idx] != ':':
+                return fields
+            idx += 1
+            while idx < length and text[idx] in ' \t\r\n':
+                idx += 1
+            value, idx = _JSON_DECODER.raw_decode(text, idx)
+        except (json.JSONDecodeError, IndexError):
+            return fields
+        fields[key] = value
+
+def _fix_llm_json(json_str: str) -> str:
+    """Repair the usual LLM JSON slips: trailing commas and single-quoted keys/values"""
+    # Fix trailing commas first
+    json_str = _TRAILING_COMMA_OBJECT_RE.sub('}', json_str)
+    json_str = _TRAILING_COMMA_ARRAY_RE.sub(']', json_str)
+    
+    # Fix single quotes to double quotes - be more careful
+    # Replace 'key': patterns
+    json_str = _SINGLE_QUOTED_KEY_RE.sub(r'"\1":', json_str)
+    
+    # Replace key: 'value' patterns - handle function strings carefully
+    def fix_string_quotes(match):
+        key = match.group(1)
+        value = match.group(2)
+        # Escape any double quotes in the value
+        value = value.replace('"', '\\"')
+        return f'{key}: "{value}"'
+    
+    return _SINGLE_QUOTED_PAIR_RE.sub(fix_string_quotes, json_str)
+
 def process_action_message(action_message: str, component_type: Optional[str] = None, 
                           component_id: Optional[str] = None, current_props: Optional[dict] = None,
                           pages: Optional[List[dict]] = None) -> dict:
@@ -1580,8 +1743,8 @@ Return ONLY the JSON object, no explanations."""
     user_prompt = f"""ACTION REQUEST: {action_message}
 COMPONENT TYPE: {component_type or 'button'}
 COMPONENT ID: {component_id or 'unknown'}
-CURRENT PROPS: {json.dumps(current_props or {}, indent=2)}
-AVAILABLE PAGES: {json.dumps(pages or [], indent=2) if pages else '[]'}
+CURRENT PROPS: {_json_dumps_indented(current_props or {})}
+AVAILABLE PAGES: {_json_dumps_indented(pages) if pages else '[]'}
 
 IMPORTANT: You are MODIFYING an existing component with ID {component_id}. DO NOT create a new component.
 Only return the event handler code (e.g., onClick function) and props that need to be added/modified.
@@ -1593,41 +1756,25 @@ Generate the React code and explanation for this action."""
         llm_response = call_ollama(user_prompt, system_prompt)
         if llm_response:
             try:
-                # Parse JSON from LLM response
-                # First, try to find JSON block (may be in markdown code blocks)
-                cleaned_response = llm_response
-                
-                # Remove markdown code blocks if present
-                cleaned_response = re.sub(r'```json\s*\n?', '', cleaned_response)
-                cleaned_response = re.sub(r'```\s*\n?', '', cleaned_response)
-                cleaned_response = re.sub(r'```[a-z]*\s*\n?', '', cleaned_response)
-                
-                # Try to find JSON object
-                json_match = re.search(r'\{[\s\S]*\}', cleaned_response, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group()
-                
-                # Try to fix common JSON issues
-                # Fix trailing commas first
-                json_str = re.sub(r',\s*}', '}', json_str)
-                json_str = re.sub(r',\s*]', ']', json_str)
-                
-                # Fix single quotes to double quotes - be more careful
-                # Replace 'key': patterns
-                json_str = re.sub(r"'(\w+)':", r'"\1":', json_str)
+                # Parse JSON from LLM response (may be wrapped in markdown code blocks)
+                json_str = _extract_json_object(llm_response)
+                if json_str is None:
+                    logger.warning("No JSON object found in LLM response")
+                    return process_action_patterns(action_message, component_type, pages)
                 
-                # Replace key: 'value' patterns - handle function strings carefully
-                def fix_string_quotes(match):
-                    key = match.group(1)
-                    value = match.group(2)
-                    # Escape any double quotes in the value
-                    value = value.replace('"', '\\"')
-                    return f'{key}: "{value}"'
+                try:
+                    # Well-formed replies parse as-is; the regex fixers only run when this fails
+                    parsed = _json_loads(json_str)
+                except json.JSONDecodeError:
+                    parsed = None
                 
-                json_str = re.sub(r'(\w+):\s*\'([^\']*)\'', fix_string_quotes, json_str)
+                if parsed is None:
+                    # Try to fix common JSON issues
+                    json_str = _fix_llm_json(json_str)
                 
                 try:
-                    parsed = json.loads(json_str)
+                    if parsed is None:
+                        parsed = _json_loads(json_str)
                 except json.JSONDecodeError as e:
                     logger.warning(f"JSON parse error, trying to fix: {e}")
                     logger.debug(f"Problematic JSON (first attempt): {json_str[:300]}")
@@ -1642,12 +1789,12 @@ Generate the React code and explanation for this action."""
                     
                     # More careful quote fixing
                     # Replace single quotes in keys
-                    json_str = re.sub(r"'(\w+)':", r'"\1":', json_str)
+                    json_str = _SINGLE_QUOTED_KEY_RE.sub(r'"\1":', json_str)
                     # For values, escape quotes properly
-                    json_str = re.sub(r":\s*'([^']*)'", lambda m: f': "{m.group(1).replace(chr(34), chr(92)+chr(34))}"', json_str)
+                    json_str = _SINGLE_QUOTED_VALUE_RE.sub(lambda m: f': "{m.group(1).replace(chr(34), chr(92)+chr(34))}"', json_str)
                     
                     try:
-                        parsed = json.loads(json_str)
+                        parsed = _json_loads(json_str)
                     except json.JSONDecodeError as e2:
                         logger.error(f"Could not parse LLM response as JSON after fixes: {e2}")
                         logger.debug(f"Problematic JSON string: {json_str[:500]}")
@@ -1662,12 +1809,12 @@ Generate the React code and explanation for this action."""
                     # If action_code contains a full button/component element, extract just the onClick handler
                     if "<button" in action_code or "<Button" in action_code:
                         # Extract onClick handler from the component
-                        onClick_match = re.search(r'onClick\s*=\s*["\']?([^"\']+)["\']?', action_code, re.IGNORECASE)
+                        onClick_match = _ONCLICK_ATTR_RE.search(action_code)
                         if onClick_match:
                             parsed["action_code"] = onClick_match.group(1).strip()
                         else:
                             # Try to extract from JSX format onClick={{...}}
-                            onClick_match = re.search(r'onClick\s*=\s*\{\{([^}]+)\}\}', action_code, re.IGNORECASE)
+                            onClick_match = _ONCLICK_JSX_RE.search(action_code)
                             if onClick_match:
                                 parsed["action_code"] = onClick_match.group(1).strip()
                             else:
@@ -1692,12 +1839,12 @@ Generate the React code and explanation for this action."""
                             # Remove any JSX/HTML tags - if it looks like a full button element, extract just the onClick value
                             if "<button" in onClick_value or "<Button" in onClick_value:
                                 # Extract function from onClick="..." or onClick={...}
-                                func_match = re.search(r'onClick\s*=\s*["\']?([^"\']+)["\']?', onClick_value, re.IGNORECASE)
+                                func_match = _ONCLICK_ATTR_RE.search(onClick_value)
                                 if func_match:
                                     props["onClick"] = func_match.group(1).strip()
                                 else:
                                     # Try to extract function from JSX
-                                    func_match = re.search(r'\{([^}]+)\}', onClick_value)
+                                    func_match = _BRACED_EXPR_RE.search(onClick_value)
                                     if func_match:
                                         props["onClick"] = func_match.group(1).strip()
                                     else:
@@ -1722,6 +1869,39 @@ Generate the React code and explanation for this action."""
         logger.error(f"Error processing action message: {e}", exc_info=True)
         return process_action_patterns(action_message, component_type, pages)
 
+_NAVIGATION_RE = re.compile(r'(open|navigate|go|redirect|route).*?(page|route)')
+_MESSAGE_RE = re.compile(r'(show|display|alert|message|toast|notification)')
+# Message actions by keyword (first match wins): (keyword, action_code, explanation)
+_MESSAGE_ACTIONS = (
+    ('success', "() => { alert('Success!'); }", "When clicked, this will show a success message"),
+    ('error', "() => { alert('Error occurred'); }", "When clicked, this will show an error message"),
+)
+_DEFAULT_MESSAGE_ACTION = ("() => { alert('Action completed'); }", "When clicked, this will show a message")
+_DEFAULT_ACTION = ("() => { console.log('Action triggered'); }", "When clicked, this will trigger an action")
+
+def _navigation_action(lower_msg: str, pages: Optional[List[dict]]) -> tuple:
+    """(action_code, explanation) navigating to the page the message names, else home"""
+    # Extract target page
+    target_page = None
+    if pages:
+        for page in pages:
+            page_name = page.get('name', '').lower()
+            page_route = page.get('route', '').lower()
+            if any(word in page_name or word in page_route for word in ['login', 'signin']):
+                if 'login' in lower_msg or 'signin' in lower_msg:
+                    target_page = page
+                    break
+            elif any(word in page_name or word in page_route for word in ['home', 'index', 'main']):
+                if 'home' in lower_msg or 'main' in lower_msg:
+                    target_page = page
+                    break
+    
+    if target_page:
+        route = target_page.get('route', '/')
+        return (f"() => {{ window.location.href = '{route}'; }}",
+                f"When clicked, this will navigate to {target_page.get('name', 'the target page')}")
+    return "() => { window.location.href = '/'; }", "When clicked, this will navigate to the home page"
+
 def process_action_patterns(action_message: str, component_type: Optional[str] = None, 
                            pages: Optional[List[dict]] = None) -> dict:
     """Fallback pattern-based processing for action messages."""
@@ -1731,102 +1911,67 @@ def process_action_patterns(action_message: str, component_type: Optional[str] =
     explanation = ""
     
     # Handle direct onClick assignment like "onClick=function that navigates to login page"
-    if re.search(r'onclick\s*=\s*["\']?', action_message, re.IGNORECASE):
+    onclick_match = _ONCLICK_ATTR_RE.search(action_message)
+    if onclick_match:
         # Extract the function description after onClick=
-        onclick_match = re.search(r'onclick\s*=\s*["\']?([^"\']+)["\']?', action_message, re.IGNORECASE)
-        if onclick_match:
-            func_desc = onclick_match.group(1).strip()
-            # Process the function description
-            if 'navigate' in func_desc.lower() or 'login' in func_desc.lower() or 'page' in func_desc.lower():
-                # Find login page
-                target_page = None
-                if pages:
-                    for page in pages:
-                        page_name = page.get('name', '').lower()
-                        page_route = page.get('route', '').lower()
-                        if 'login' in page_name or 'login' in page_route:
-                            target_page = page
-                            break
-                
-                if target_page:
-                    route = target_page.get('route', '/login')
-                    action_code = f"() => {{ window.location.href = '{route}'; }}"
-                    explanation = f"When clicked, this will navigate to {target_page.get('name', 'the login page')}"
-                else:
-                    action_code = "() => { window.location.href = '/login'; }"
-                    explanation = "When clicked, this will navigate to the login page"
-                changes["props"]["onClick"] = action_code
-                detailed_changes = [f"• Add onClick event handler: {action_code}"]
-                return {
-                    "action_code": action_code,
-                    "explanation": explanation,
-                    "changes": changes,
-                    "detailed_changes": "\n".join(detailed_changes),
-                    "project_impact": "This change will modify the component's behavior. When users click this component, it will navigate to the login page."
-                }
-    
-    # Navigation patterns
-    if re.search(r'(open|navigate|go|redirect|route).*?(page|route)', lower_msg):
-        # Extract target page
-        target_page = None
-        if pages:
-            for page in pages:
-                page_name = page.get('name', '').lower()
-                page_route = page.get('route', '').lower()
-                if any(word in page_name or word in page_route for word in ['login', 'signin']):
-                    if 'login' in lower_msg or 'signin' in lower_msg:
-                        target_page = page
-                        break
-                elif any(word in page_name or word in page_route for word in ['home', 'index', 'main']):
-                    if 'home' in lower_msg or 'main' in lower_msg:
+        func_desc = onclick_match.group(1).strip()
+        # Process the function description
+        if 'navigate' in func_desc.lower() or 'login' in func_desc.lower() or 'page' in func_desc.lower():
+            # Find login page
+            target_page = None
+            if pages:
+                for page in pages:
+                    page_name = page.get('name', '').lower()
+                    page_route = page.get('route', '').lower()
+                    if 'login' in page_name or 'login' in page_route:
                         target_page = page
                         break
-        
-        if target_page:
-            route = target_page.get('route', '/')
-            action_code = f"() => {{ window.location.href = '{route}'; }}"
-            explanation = f"When clicked, this will navigate to {target_page.get('name', 'the target page')}"
-            changes["props"]["onClick"] = action_code
-        else:
-            action_code = "() => { window.location.href = '/'; }"
-            explanation = "When clicked, this will navigate to the home page"
+            
+            if target_page:
+                route = target_page.get('route', '/login')
+                action_code = f"() => {{ window.location.href = '{route}'; }}"
+                explanation = f"When clicked, this will navigate to {target_page.get('name', 'the login page')}"
+            else:
+                action_code = "() => { window.location.href = '/login'; }"
+                explanation = "When clicked, this will navigate to the login page"
             changes["props"]["onClick"] = action_code
+            detailed_changes = [f"• Add onClick event handler: {action_code}"]
+            return {
+                "action_code": action_code,
+                "explanation": explanation,
+                "changes": changes,
+                "detailed_changes": "\n".join(detailed_changes),
+                "project_impact": "This change will modify the component's behavior. When users click this component, it will navigate to the login page."
+            }
     
-    # Alert/Message patterns
-    elif re.search(r'(show|display|alert|message|toast|notification)', lower_msg):
-        if 'success' in lower_msg:
-            action_code = "() => { alert('Success!'); }"
-            explanation = "When clicked, this will show a success message"
-        elif 'error' in lower_msg:
-            action_code = "() => { alert('Error occurred'); }"
-            explanation = "When clicked, this will show an error message"
-        else:
-            action_code = "() => { alert('Action completed'); }"
-            explanation = "When clicked, this will show a message"
-        changes["props"]["onClick"] = action_code
-    
-    # Default: onClick handler
+    # Navigation, then message, then a generic handler - first matching kind wins
+    if _NAVIGATION_RE.search(lower_msg):
+        action_code, explanation = _navigation_action(lower_msg, pages)
+    elif _MESSAGE_RE.search(lower_msg):
+        action_code, explanation = next(
+            ((code, text) for keyword, code, text in _MESSAGE_ACTIONS if keyword in lower_msg),
+            _DEFAULT_MESSAGE_ACTION
+        )
     else:
-        action_code = "() => { console.log('Action triggered'); }"
-        explanation = "When clicked, this will trigger an action"
-        changes["props"]["onClick"] = action_code
+        action_code, explanation = _DEFAULT_ACTION
+    changes["props"]["onClick"] = action_code
     
     # Generate detailed changes description
-    detailed_changes = []
-    if changes.get("props"):
-        for prop_key, prop_value in changes["props"].items():
-            if prop_key == "onClick":
-                detailed_changes.append(f"• Add onClick event handler: {prop_value}")
-            else:
-                detailed_changes.append(f"• Add/Update property '{prop_key}': {prop_value}")
+    detailed_changes = [
+        f"• Add onClick event handler: {prop_value}" if prop_key == "onClick"
+        else f"• Add/Update property '{prop_key}': {prop_value}"
+        for prop_key, prop_value in changes["props"].items()
+    ]
     
-    project_impact = "This change will modify the component's behavior. "
-    if "onClick" in changes.get("props", {}):
-        project_impact += "When users interact with this component, the specified action will be triggered. "
-        if "navigate" in action_code.lower() or "location" in action_code.lower():
-            project_impact += "This will cause page navigation in the generated application."
-        elif "alert" in action_code.lower():
-            project_impact += "This will display a message to users."
+    impact_parts = ["This change will modify the component's behavior. "]
+    if "onClick" in changes["props"]:
+        impact_parts.append("When users interact with this component, the specified action will be triggered. ")
+        action_code_lower = action_code.lower()
+        if "navigate" in action_code_lower or "location" in action_code_lower:
+            impact_parts.append("This will cause page navigation in the generated application.")
+        elif "alert" in action_code_lower:
+            impact_parts.append("This will display a message to users.")
+    project_impact = "".join(impact_parts)
     
     return {
         "action_code": action_code,
@@ -1846,7 +1991,9 @@ async def process_action(
     Example: "when signup button click then open login page"
     """
     try:
-        result = process_action_message(
+        # Blocking (LLM HTTP call + parsing) - keep it off the event loop
+        result = await run_in_threadpool(
+            process_action_message,
             request.action_message,
             request.component_type,
             request.component_id,
@@ -1869,12 +2016,10 @@ async def process_action(
             detail=f"Failed to process action: {str(e)}"
         )
 
-def analyze_and_fix_error(error_message: str, error_traceback: Optional[str] = None, 
-                         file_path: Optional[str] = None, project_id: Optional[int] = None) -> Dict[str, Any]:
-    """
-    Analyze an error message and generate a fix for backend code.
-    """
-    system_prompt = """You are an expert developer specializing in debugging and fixing errors in JavaScript, React, Python, and FastAPI code.
+# Static system prompt for analyze_and_fix_error. It is sent unchanged on every call,
+# and the per-error context only goes in the user prompt, so Ollama can reuse the
+# cached prefix while the model stays loaded (see OLLAMA_KEEP_ALIVE)
+_ERROR_FIX_SYSTEM_PROMPT = """You are an expert developer specializing in debugging and fixing errors in JavaScript, React, Python, and FastAPI code.
 
 YOUR TASK: Analyze error messages and tracebacks to identify the root cause and generate COMPLETE FIXED CODE.
 
@@ -1926,9 +2071,301 @@ RULES:
 7. Be specific about line numbers if traceback provides them
 
 Return ONLY the JSON object, no explanations."""
+
+# analyze_and_fix_error results by error signature -> (timestamp, result). Dev loops hit
+# the same error against the same file over and over; this skips the LLM round trip
+_ERROR_FIX_CACHE: Dict[str, tuple] = {}
+_ERROR_FIX_CACHE_TTL = 24 * 60 * 60  # 24 hours
+_ERROR_FIX_CACHE_MAX = 256
+# Line numbers, memory addresses and timestamps change between otherwise identical errors
+_ERROR_VOLATILE_RE = re.compile(r'\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?|0x[0-9a-fA-F]+|:\d+|\bline \d+')
+
+# Where a traceback/error message names the failing file, most specific form first:
+# File "path.py", "path.py", File path.py, then any bare path.py. (The old "in/at/line
+# <path>" forms are covered by the bare-path pattern, which is tried before them.)
+_ERROR_FILE_RE = _fuse_patterns([
+    r'File\s+["\']([^"\']+\.(py|js|jsx|ts|tsx))["\']',
+    r'["\']([^"\']+\.(py|js|jsx|ts|tsx))["\']',
+    r'File\s+([^\s,]+\.(py|js|jsx|ts|tsx))',
+    r'([^\s,]+\.(py|js|jsx|ts|tsx))',
+])
+_LINE_SUFFIX_RE = re.compile(r':\d+$')
+
+def _extract_error_file(search_text: str) -> Optional[str]:
+    """File path mentioned in an error message or traceback, without a :line suffix"""
+    match = _fused_groups(_ERROR_FILE_RE, search_text)
+    if not match:
+        return None
+    # Clean up the file path (e.g., "file.py:123" -> "file.py")
+    return _LINE_SUFFIX_RE.sub('', match[0].strip('"\'')) or None
+
+# project id -> generated project directory. Only hits are stored (a project may be
+# generated after a miss) and each hit is re-checked with one stat before use, so a
+# deleted project directory is dropped instead of served
+_PROJECT_DIR_CACHE: Dict[int, Path] = {}
+
+def _find_project_dir(project_id: Optional[int]) -> Optional[Path]:
+    """Generated project directory (project_<id>_*) for a project id, or None"""
+    if not project_id:
+        return None
+    cached = _PROJECT_DIR_CACHE.get(project_id)
+    if cached is not None:
+        if cached.is_dir():
+            return cached
+        _PROJECT_DIR_CACHE.pop(project_id, None)
+    from app.services.code_generator import GENERATED_APPS_DIR
+    project_dir = next(Path(GENERATED_APPS_DIR).glob(f"project_{project_id}_*"), None)
+    if project_dir is not None:
+        _PROJECT_DIR_CACHE[project_id] = project_dir
+    return project_dir
+
+def forget_project_dir(project_id: int) -> None:
+    """Drop a cached project directory; called when a project is regenerated or deleted"""
+    _PROJECT_DIR_CACHE.pop(project_id, None)
+
+# Directories in a generated project that never contain the source file an error
+# points at (dependencies, virtualenvs, VCS data, caches, build output). A virtualenv
+# is also full of utils.py/main.py look-alikes that would shadow the real file
+_SEARCH_SKIP_DIRS = frozenset({
+    'node_modules', 'venv', '.venv', '.git', '__pycache__', '.cache', '.next',
+    'dist', 'build', 'coverage',
+})
+
+def _iter_project_entries(root: Path, matches: Callable[[str], bool], include_dirs: bool = False):
+    """
+    Yield files (and directories, if include_dirs) under root whose name satisfies
+    matches, shallowest first. A breadth-first os.scandir walk: DirEntry carries the
+    file type, so unlike rglob no entry needs its own stat(), and dependency/build
+    trees are skipped entirely.
+    """
+    pending = deque([root])
+    while pending:
+        directory = pending.popleft()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name in _SEARCH_SKIP_DIRS:
+                            continue
+                        pending.append(entry.path)
+                        if include_dirs and matches(entry.name):
+                            yield Path(entry.path)
+                    elif matches(entry.name):
+                        yield Path(entry.path)
+        except OSError:
+            continue
+
+def _iter_files_named(root: Path, name: str):
+    """Yield files called `name` under root, shallowest first, skipping _SEARCH_SKIP_DIRS"""
+    return _iter_project_entries(root, name.__eq__)
+
+def _find_file_bfs(root: Path, name: str) -> Optional[Path]:
+    """The shallowest file called `name` under root, or None"""
+    return next(_iter_files_named(root, name), None)
+
+def _candidate_error_paths(project_dir: Path, found_file: str):
+    """
+    Where a file named in an error might live inside a generated project, most specific
+    first. A generator, so the recursive search only runs if no direct path exists.
+    """
+    found_path = Path(found_file)
+    file_name = found_path.name
+    file_dir = found_path.parent
+    
+    # Direct path matches
+    yield project_dir / found_file
+    yield project_dir / "backend" / found_file
+    yield project_dir / "frontend" / found_file
+    yield project_dir / "backend" / found_file.replace("app/", "")
+    yield project_dir / "frontend" / "src" / found_file
+    
+    if not file_name:
+        return
+    
+    # Filename-only matches
+    yield project_dir / "backend" / file_name
+    yield project_dir / "frontend" / file_name
+    yield project_dir / "frontend" / "src" / file_name
+    
+    # Directory + filename matches
+    if file_dir != Path('.'):
+        yield project_dir / "backend" / file_dir / file_name
+        yield project_dir / "frontend" / file_dir / file_name
+        yield project_dir / "frontend" / "src" / file_dir / file_name
+    
+    # Recursive search for filename
+    yield from _iter_files_named(project_dir, file_name)
+
+def _error_signature(error_message: str, error_traceback: Optional[str],
+                     file_content: Optional[str], actual_file_path: Optional[Path],
+                     project_id: Optional[int], llm_route: tuple) -> str:
+    """
+    Cache key for an error: normalized message + last traceback line + file content hash,
+    scoped to the project and to the backend/model that answers (llm_route). Without a
+    resolved file the fix is a blind full file, which must not leak into another project
+    """
+    last_frame = error_traceback.strip().rsplit('\n', 1)[-1] if error_traceback else ''
+    parts = (
+        _ERROR_VOLATILE_RE.sub('', error_message),
+        _ERROR_VOLATILE_RE.sub('', last_frame),
+        hashlib.sha1(file_content.encode()).hexdigest() if file_content is not None else '',
+        str(actual_file_path or ''),
+        str(project_id),
+        repr(llm_route),
+    )
+    return hashlib.sha1('\x00'.join(parts).encode()).hexdigest()
+
+# User-prompt tail for the full-file fix (appended after the per-error context)
+_ERROR_FIX_INSTRUCTIONS = """
+
+CRITICAL INSTRUCTIONS:
+1. Read the CURRENT FILE CONTENT above (if provided)
+2. Identify the exact issue causing the error
+3. Return the COMPLETE FIXED FILE CONTENT in the "fix_code" field
+4. Do NOT return explanations or instructions - return actual working code
+5. For undefined variables: Add the function/variable definition
+6. For React: Ensure all functions are defined before use
+7. Preserve all existing code that doesn't need changes
+8. Include ALL imports and exports
+
+Analyze this error and provide the COMPLETE FIXED FILE CONTENT."""
+
+# Edit-based variant of _ERROR_FIX_SYSTEM_PROMPT, used when the current file is in the
+# prompt: a one-line fix costs a few dozen output tokens instead of the whole file
+_ERROR_EDIT_SYSTEM_PROMPT = """You are an expert developer specializing in debugging and fixing errors in JavaScript, React, Python, and FastAPI code.
+
+YOUR TASK: Analyze error messages and tracebacks to identify the root cause and return the MINIMAL EDITS that fix it.
+
+CRITICAL RULES:
+1. Return the fix as search/replace edits in "edits" - do NOT return the whole file.
+2. Each "search" must be copied EXACTLY (including indentation) from the CURRENT FILE CONTENT and must appear only once in it - include a few surrounding lines if needed to make it unique.
+3. DO NOT create new components, files, or features - ONLY fix the existing error in the provided file.
+4. DO NOT add new functionality - ONLY fix what is broken.
+5. Read the error message carefully and fix ONLY the specific issue mentioned.
+
+OUTPUT FORMAT - Return ONLY valid JSON:
+{
+  "issue_identified": "Brief description of the issue (e.g., 'Undefined variable handleSignup', 'Missing import statement')",
+  "root_cause": "Detailed explanation of why this error occurred",
+  "edits": [
+    {"search": "exact lines from the current file", "replace": "the fixed lines"}
+  ],
+  "file_path": "Path to the file that needs fixing (e.g., 'src/pages/SignupPage.js' or 'backend/main.py')",
+  "explanation": "Step-by-step explanation of the fix",
+  "confidence": 0.95,
+  "line_number": 123  // Optional: line number where the error occurs
+}
+
+RULES:
+1. To add code (e.g., a missing import or function), search for the line it should follow and replace it with that line plus the new code
+2. Include necessary imports
+3. Maintain code style and conventions
+4. Be specific about line numbers if traceback provides them
+
+Return ONLY the JSON object, no explanations."""
+
+_ERROR_EDIT_INSTRUCTIONS = """
+
+CRITICAL INSTRUCTIONS:
+1. Read the CURRENT FILE CONTENT above
+2. Identify the exact issue causing the error
+3. Return search/replace edits in the "edits" field - "search" text must match the file exactly
+4. Do NOT return explanations or instructions - return actual working code in "replace"
+5. For undefined variables: Add the function/variable definition
+6. For React: Ensure all functions are defined before use
+
+Analyze this error and provide the edits that fix it."""
+
+# Error classes with a well-known, local fix (missing import, undefined name, missing
+# colon/bracket, bad indentation) - a small coder model handles these fine
+_TRIVIAL_ERROR_RE = re.compile(
+    r'ImportError|ModuleNotFoundError|NameError|is not defined|IndentationError|TabError'
+    r'|SyntaxError: (?:expected \'?:|invalid syntax|unexpected EOF|unterminated string|\'?\(\'? was never closed)'
+)
+
+def _classify_error(error_message: str) -> str:
+    """'trivial' for the well-known error classes in _TRIVIAL_ERROR_RE, 'hard' otherwise"""
+    return 'trivial' if _TRIVIAL_ERROR_RE.search(error_message) else 'hard'
+
+# Files longer than this are sent to the edit prompt as a window of
+# _FILE_EXCERPT_RADIUS lines either side of the error line
+_FILE_EXCERPT_MIN_LINES = 120
+_FILE_EXCERPT_RADIUS = 40
+
+def _error_line_number(error_text: str, file_name: str) -> Optional[int]:
+    """Line reported for file_name in a traceback ('name.py", line 12' or 'name.js:12:5')"""
+    if not error_text:
+        return None
+    matches = re.findall(re.escape(file_name) + r'["\']?(?:,\s*line\s+|:)(\d+)', error_text)
+    # The last frame mentioning the file is the innermost one
+    return int(matches[-1]) if matches else None
+
+def _file_excerpt(content: str, line_number: int) -> str:
+    """Context-part text for the lines around line_number, with a truncation marker"""
+    lines = content.split('\n')
+    start = max(0, line_number - 1 - _FILE_EXCERPT_RADIUS)
+    end = min(len(lines), line_number + _FILE_EXCERPT_RADIUS)
+    return (f"CURRENT FILE CONTENT (truncated, lines {start + 1}-{end} of {len(lines)}):\n"
+            + '\n'.join(lines[start:end]))
+
+def _request_error_fix(user_prompt: str, system_prompt: str, model_override: Optional[str] = None) -> Optional[dict]:
+    """Ask the LLM for an error fix and parse its JSON reply; None if there is no usable reply"""
+    llm_response = call_ollama(user_prompt, system_prompt, model="deepseek-coder", model_override=model_override)
+    if not llm_response:
+        return None
+    
+    # Parse JSON from LLM response (may be wrapped in markdown code blocks)
+    json_str = _extract_json_object(llm_response)
+    if json_str is None:
+        # No closing brace at all - most likely cut off; the salvage below still applies
+        json_str = llm_response
     
-    # Build context for the LLM
+    # Fix common JSON issues
+    json_str = _TRAILING_COMMA_OBJECT_RE.sub('}', json_str)
+    json_str = _TRAILING_COMMA_ARRAY_RE.sub(']', json_str)
+    json_str = _SINGLE_QUOTED_KEY_RE.sub(r'"\1":', json_str)
+    
+    try:
+        parsed = _json_loads(json_str)
+    except json.JSONDecodeError as e:
+        # Usually a reply cut off inside fix_code - keep the fields that did arrive
+        # (issue, root cause, ...) rather than discarding the whole answer
+        parsed = _salvage_json_fields(llm_response)
+        if not parsed:
+            logger.warning(f"Could not parse LLM response as JSON: {e}")
+            return None
+        logger.warning(f"LLM response JSON was incomplete ({e}); recovered fields: {', '.join(parsed)}")
+    return parsed if isinstance(parsed, dict) else None
+
+def _apply_search_replace_edits(content: str, edits) -> Optional[str]:
+    """
+    Apply LLM search/replace edits to a file's content. Every search string must occur
+    exactly once; otherwise None is returned and nothing is applied.
+    """
+    if not isinstance(edits, list) or not edits:
+        return None
+    for edit in edits:
+        if not isinstance(edit, dict):
+            return None
+        search, replace = edit.get("search"), edit.get("replace", "")
+        if not isinstance(search, str) or not search or not isinstance(replace, str):
+            return None
+        if content.count(search) != 1:
+            return None
+        content = content.replace(search, replace, 1)
+    return content
+
+def _build_error_context(error_message: str, error_traceback: Optional[str], file_path: Optional[str],
+                         project_id: Optional[int]) -> tuple[List[str], Optional[str], Optional[Path]]:
+    """
+    Collect the LLM context for an error: the message, traceback and, when it can be
+    located, the affected file. This is the expensive part of analyze_and_fix_error
+    (project lookup, path probing, recursive search, file reads), so callers try the
+    local fixes in _PROACTIVE_FIXERS first and only build it when the LLM is needed.
+    Returns (context_parts, file_content, actual_file_path).
+    """
     context_parts = [f"ERROR MESSAGE: {error_message}"]
+    file_content = None
     
     if error_traceback:
         context_parts.append(f"TRACEBACK:\n{error_traceback}")
@@ -1938,14 +2375,8 @@ Return ONLY the JSON object, no explanations."""
     if project_id:
         context_parts.append(f"PROJECT ID: {project_id}")
         # Try to find the project directory
-        from app.services.code_generator import GENERATED_APPS_DIR
-        base_dir = Path(GENERATED_APPS_DIR)
-        
-        # Search for project directory
-        pattern = f"project_{project_id}_*"
-        matching_dirs = list(base_dir.glob(pattern))
-        if matching_dirs:
-            project_dir = matching_dirs[0]
+        project_dir = _find_project_dir(project_id)
+        if project_dir:
             
             # If file_path is provided, try to find it in the project
             if file_path:
@@ -1961,8 +2392,7 @@ Return ONLY the JSON object, no explanations."""
                     if possible_path.exists():
                         actual_file_path = possible_path
                         try:
-                            with open(possible_path, 'r') as f:
-                                file_content = f.read()
+                            file_content = possible_path.read_text(encoding='utf-8')
                             context_parts.append(f"FILE PATH: {possible_path}")
                             context_parts.append(f"CURRENT FILE CONTENT:\n{file_content}")
                             break
@@ -1973,77 +2403,20 @@ Return ONLY the JSON object, no explanations."""
             if not actual_file_path:
                 search_text = error_traceback or error_message
                 if search_text:
-                    # Enhanced file path extraction patterns
-                    file_patterns = [
-                        r'File\s+["\']([^"\']+\.(py|js|jsx|ts|tsx))["\']',  # File "path/to/file.py"
-                        r'["\']([^"\']+\.(py|js|jsx|ts|tsx))["\']',  # "path/to/file.py"
-                        r'File\s+([^\s,]+\.(py|js|jsx|ts|tsx))',  # File path/to/file.py
-                        r'([^\s,]+\.(py|js|jsx|ts|tsx))',  # path/to/file.py
-                        r'in\s+([^\s,]+\.(py|js|jsx|ts|tsx))',  # in path/to/file.py
-                        r'at\s+([^\s,]+\.(py|js|jsx|ts|tsx))',  # at path/to/file.py
-                        r'line\s+\d+.*?([^\s,]+\.(py|js|jsx|ts|tsx))',  # line 123 in path/to/file.py
-                    ]
-                    
-                    found_file = None
-                    for pattern in file_patterns:
-                        file_match = re.search(pattern, search_text, re.IGNORECASE)
-                        if file_match:
-                            found_file = file_match.group(1)
-                            # Clean up the file path (remove line numbers, etc.)
-                            found_file = found_file.strip('"\'')
-                            # Remove line number if present (e.g., "file.py:123" -> "file.py")
-                            found_file = re.sub(r':\d+$', '', found_file)
-                            if found_file:
-                                break
+                    found_file = _extract_error_file(search_text)
                     
                     if found_file:
                         # Try to find it in project with multiple search strategies
-                        # Extract just the filename and directory parts
-                        file_name = Path(found_file).name
-                        file_dir = Path(found_file).parent
-                        
-                        # Build comprehensive search paths
-                        possible_paths = []
-                        
-                        # Direct path matches
-                        possible_paths.extend([
-                            project_dir / found_file,
-                            project_dir / "backend" / found_file,
-                            project_dir / "frontend" / found_file,
-                            project_dir / "backend" / found_file.replace("app/", ""),
-                            project_dir / "frontend" / "src" / found_file,
-                        ])
-                        
-                        # Filename-only matches (search recursively)
-                        if file_name:
-                            possible_paths.extend([
-                                project_dir / "backend" / file_name,
-                                project_dir / "frontend" / file_name,
-                                project_dir / "frontend" / "src" / file_name,
-                            ])
-                            
-                            # Recursive search for filename
-                            for py_file in project_dir.rglob(file_name):
-                                possible_paths.append(py_file)
-                        
-                        # Directory + filename matches
-                        if file_dir and file_dir != Path('.'):
-                            possible_paths.extend([
-                                project_dir / "backend" / file_dir / file_name,
-                                project_dir / "frontend" / file_dir / file_name,
-                                project_dir / "frontend" / "src" / file_dir / file_name,
-                            ])
-                        
-                        # Remove duplicates and check existence
+                        # Candidates are generated lazily (direct paths first, the recursive
+                        # search last), so the walk stops at the first existing file
                         seen = set()
-                        for possible_path in possible_paths:
-                            path_str = str(possible_path)
+                        for possible_path in _candidate_error_paths(project_dir, found_file):
+                            path_str = os.path.realpath(possible_path)
                             if path_str not in seen and possible_path.exists():
                                 seen.add(path_str)
                                 actual_file_path = possible_path
                                 try:
-                                    with open(possible_path, 'r') as f:
-                                        file_content = f.read()
+                                    file_content = possible_path.read_text(encoding='utf-8')
                                     context_parts.append(f"FILE PATH (extracted from error): {possible_path}")
                                     context_parts.append(f"CURRENT FILE CONTENT:\n{file_content}")
                                     logger.info(f"Found and read file from error message: {possible_path}")
@@ -2061,56 +2434,83 @@ Return ONLY the JSON object, no explanations."""
             file_path_obj = Path(file_path)
             if file_path_obj.exists():
                 actual_file_path = file_path_obj
-                with open(file_path_obj, 'r') as f:
-                    file_content = f.read()
+                file_content = file_path_obj.read_text(encoding='utf-8')
                 context_parts.append(f"CURRENT FILE CONTENT:\n{file_content}")
         except Exception as e:
             logger.warning(f"Could not read file {file_path}: {e}")
     
-    user_prompt = "\n\n".join(context_parts) + """
+    return context_parts, file_content, actual_file_path
 
-CRITICAL INSTRUCTIONS:
-1. Read the CURRENT FILE CONTENT above (if provided)
-2. Identify the exact issue causing the error
-3. Return the COMPLETE FIXED FILE CONTENT in the "fix_code" field
-4. Do NOT return explanations or instructions - return actual working code
-5. For undefined variables: Add the function/variable definition
-6. For React: Ensure all functions are defined before use
-7. Preserve all existing code that doesn't need changes
-8. Include ALL imports and exports
-
-Analyze this error and provide the COMPLETE FIXED FILE CONTENT."""
+def analyze_and_fix_error(error_message: str, error_traceback: Optional[str] = None, 
+                         file_path: Optional[str] = None, project_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Analyze an error message and generate a fix for backend code.
+    """
+    context_parts, file_content, actual_file_path = _build_error_context(
+        error_message, error_traceback, file_path, project_id
+    )
+    
+    # With the current file in context the model only has to return edits, not re-emit
+    # the whole file; without it, ask for the complete fixed file as before
+    use_edits = file_content is not None
+    excerpt_sent = False
+    context = "\n\n".join(context_parts)
+    if use_edits:
+        # Edits only need the code around the error, so large files are cut down to a
+        # window around the reported line (the edits still apply to the whole file)
+        error_line = _error_line_number(error_traceback or error_message, actual_file_path.name)
+        edit_context = context
+        if error_line and file_content.count('\n') > _FILE_EXCERPT_MIN_LINES:
+            excerpt = _file_excerpt(file_content, error_line)
+            excerpt_sent = True
+            edit_context = "\n\n".join(
+                excerpt if part.startswith("CURRENT FILE CONTENT:\n") else part for part in context_parts
+            )
+        user_prompt, system_prompt = edit_context + _ERROR_EDIT_INSTRUCTIONS, _ERROR_EDIT_SYSTEM_PROMPT
+    else:
+        user_prompt, system_prompt = context + _ERROR_FIX_INSTRUCTIONS, _ERROR_FIX_SYSTEM_PROMPT
+    
+    # Simple error classes go to the fast model when one is configured (OLLAMA_FAST_MODEL)
+    from app.services.settings_loader import (
+        get_ollama_fast_model, get_ollama_model, get_use_ollama, get_mcp_enabled, get_mcp_strategy
+    )
+    fast_model = get_ollama_fast_model()
+    model_override = fast_model if fast_model and _classify_error(error_message) == 'trivial' else None
+    
+    llm_route = (get_use_ollama(), get_mcp_strategy() if get_mcp_enabled() else None,
+                 model_override or get_ollama_model())
+    cache_key = _error_signature(error_message, error_traceback, file_content, actual_file_path,
+                                 project_id, llm_route)
+    cached = _ERROR_FIX_CACHE.get(cache_key)
+    if cached and time.time() - cached[0] < _ERROR_FIX_CACHE_TTL:
+        logger.info("Using cached fix for a previously analyzed error")
+        return dict(cached[1])
     
     try:
-        llm_response = call_ollama(user_prompt, system_prompt, model="deepseek-coder")
+        parsed = _request_error_fix(user_prompt, system_prompt, model_override)
         
-        if llm_response:
-            # Parse JSON from LLM response
-            cleaned_response = llm_response
-            
-            # Remove markdown code blocks if present
-            cleaned_response = re.sub(r'```json\s*\n?', '', cleaned_response)
-            cleaned_response = re.sub(r'```\s*\n?', '', cleaned_response)
-            cleaned_response = re.sub(r'```[a-z]*\s*\n?', '', cleaned_response)
-            
-            # Try to find JSON object
-            json_match = re.search(r'\{[\s\S]*\}', cleaned_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                
-                # Fix common JSON issues
-                json_str = re.sub(r',\s*}', '}', json_str)
-                json_str = re.sub(r',\s*]', ']', json_str)
-                json_str = re.sub(r"'(\w+)':", r'"\1":', json_str)
-                
-                try:
-                    parsed = json.loads(json_str)
-                    # Store the actual file path for later use
-                    if actual_file_path:
-                        parsed['_actual_file_path'] = str(actual_file_path)
-                    return parsed
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Could not parse LLM response as JSON: {e}")
+        if parsed is not None and use_edits:
+            fixed_content = _apply_search_replace_edits(file_content, parsed.pop("edits", None))
+            if fixed_content is not None:
+                parsed["fix_code"] = fixed_content
+            elif excerpt_sent or not parsed.get("fix_code"):
+                # Edits missing or not found verbatim in the file - fall back to the full file.
+                # A fix_code written from an excerpt (also in salvaged replies) is only that
+                # window, and would replace the whole file, so it is never used
+                logger.info("Could not apply the suggested edits, asking for the complete fixed file")
+                parsed = _request_error_fix(context + _ERROR_FIX_INSTRUCTIONS, _ERROR_FIX_SYSTEM_PROMPT, model_override)
+        
+        if parsed is not None:
+            # Store the actual file path for later use
+            if actual_file_path:
+                parsed['_actual_file_path'] = str(actual_file_path)
+            # Only complete LLM answers are cached; the fallbacks below and replies
+            # salvaged without a fix should be retried
+            if parsed.get("fix_code"):
+                if len(_ERROR_FIX_CACHE) >= _ERROR_FIX_CACHE_MAX:
+                    _ERROR_FIX_CACHE.pop(next(iter(_ERROR_FIX_CACHE)), None)
+                _ERROR_FIX_CACHE[cache_key] = (time.time(), dict(parsed))
+            return parsed
         
         # Fallback: Generate a basic response
         return {
@@ -2132,6 +2532,254 @@ Analyze this error and provide the COMPLETE FIXED FILE CONTENT."""
             "confidence": 0.1
         }
 
+_TRY_HEADER_RE = re.compile(r'^\s*try\s*:')
+_EXCEPT_OR_FINALLY_RE = re.compile(r'^\s*(?:except|finally)\b')
+
+def _add_missing_except_blocks(content: str) -> tuple[str, bool]:
+    """
+    Close every Python try block that has no except/finally with a generic handler.
+    Single pass over the lines: open try headers sit on a stack (by indentation) until
+    a line at their indentation is either their except/finally or ends the block, in
+    which case the handler is inserted right there. Handlers are spliced between
+    slices of the original text, so files that need no fix are returned untouched.
+    Returns (content, modified).
+    """
+    # Most files in a project have no try block at all - skip the line walk for them
+    if 'try' not in content:
+        return content, False
+    
+    pieces = []  # slices of content with the inserted handlers in between
+    copied = 0   # end of the part of content already in pieces
+    open_tries = []  # indentation strings of try headers still waiting for except/finally
+    
+    def handler(indent: str) -> str:
+        return f"{indent}except Exception as e:\n{indent}    # Handle error\n{indent}    pass"
+    
+    pos, end = 0, len(content)
+    while pos <= end:
+        line_end = content.find('\n', pos)
+        if line_end == -1:
+            line_end = end
+        line = content[pos:line_end]
+        # Indentation is measured once per line; blank and comment lines neither end a
+        # try block nor open one
+        code = line.lstrip()
+        if code and not code.startswith('#'):
+            line_indent = len(line) - len(code)
+            # Any open try at this indentation or deeper ends here
+            while open_tries and len(open_tries[-1]) >= line_indent:
+                indent = open_tries.pop()
+                if len(indent) == line_indent and _EXCEPT_OR_FINALLY_RE.match(code):
+                    break
+                pieces.append(content[copied:pos])
+                pieces.append(handler(indent) + '\n')
+                copied = pos
+            if _TRY_HEADER_RE.match(code):
+                open_tries.append(line[:line_indent])
+        pos = line_end + 1
+    
+    # Try blocks still open at end of file
+    if not pieces and not open_tries:
+        return content, False
+    pieces.append(content[copied:])
+    while open_tries:
+        pieces.append('\n' + handler(open_tries.pop()))
+    return ''.join(pieces), True
+
+def _fix_unclosed_try_blocks(project_dir: Path) -> Optional[str]:
+    """
+    Find the first Python file in the project with a try block lacking except/finally,
+    fix it in place and return its path (one file at a time); None if nothing was fixed.
+    """
+    # Search the project's own Python files (not venvs or node_modules)
+    for py_file in _iter_project_entries(project_dir, lambda name: name.endswith('.py')):
+        try:
+            with open(py_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+            
+            # The indentation heuristic can misread valid code (e.g. dedented
+            # triple-quoted strings), so only touch files that don't compile
+            try:
+                compile(content, str(py_file), 'exec')
+                continue
+            except SyntaxError:
+                pass
+            
+            # Check if this file has a try block without except/finally
+            fixed_content, modified = _add_missing_except_blocks(content)
+            
+            # If we found and fixed a try block, write it back
+            if modified:
+                with open(py_file, 'w', encoding='utf-8') as f:
+                    f.write(fixed_content)
+                logger.info(f"Proactively fixed try block in {py_file}")
+                return str(py_file)
+        except Exception as e:
+            logger.warning(f"Error checking file {py_file}: {e}")
+    return None
+
+# Import name -> pip package. Only modules listed here are added to requirements.txt
+# automatically; any other missing module may be a local import-path mistake or have
+# a differently named (or look-alike) package, so it is left to the LLM
+_MODULE_PACKAGES = {
+    'fastapi': 'fastapi',
+    'uvicorn': 'uvicorn',
+    'starlette': 'starlette',
+    'pydantic': 'pydantic',
+    'pydantic_settings': 'pydantic-settings',
+    'sqlalchemy': 'SQLAlchemy',
+    'alembic': 'alembic',
+    'psycopg': 'psycopg[binary]',
+    'pymysql': 'PyMySQL',
+    'pymongo': 'pymongo',
+    'motor': 'motor',
+    'redis': 'redis',
+    'requests': 'requests',
+    'httpx': 'httpx',
+    'aiofiles': 'aiofiles',
+    'jinja2': 'Jinja2',
+    'passlib': 'passlib[bcrypt]',
+    'bcrypt': 'bcrypt',
+    'itsdangerous': 'itsdangerous',
+    'Crypto': 'pycryptodome',
+    'dateutil': 'python-dateutil',
+    'celery': 'celery',
+    'stripe': 'stripe',
+    'boto3': 'boto3',
+    'numpy': 'numpy',
+    'pandas': 'pandas',
+    'jose': 'python-jose[cryptography]',
+    'jwt': 'PyJWT',
+    'dotenv': 'python-dotenv',
+    'multipart': 'python-multipart',
+    'yaml': 'PyYAML',
+    'PIL': 'Pillow',
+    'bs4': 'beautifulsoup4',
+    'psycopg2': 'psycopg2-binary',
+    'email_validator': 'email-validator',
+    'sklearn': 'scikit-learn',
+    'cv2': 'opencv-python',
+}
+_REQUIREMENT_NAME_RE = re.compile(r'^\s*([A-Za-z0-9_.\-]+)')
+_EMPTY_BLOCK_LINE_RE = re.compile(r'expected an indented block after .*? on line (\d+)')
+# A traceback frame; for a SyntaxError the last one is the file that failed to parse
+_TRACEBACK_FRAME_FILE_RE = re.compile(r'File "([^"]+)", line \d+')
+
+def _add_missing_requirement(project_dir: Path, match: re.Match, error_text: str) -> Optional[tuple]:
+    """ModuleNotFoundError: add the module's package to the project's requirements.txt"""
+    module = match.group(1).split('.')[0]
+    package = _MODULE_PACKAGES.get(module)
+    if package is None:
+        return None
+    # A module that exists in the project is an import-path problem, not a missing package
+    module_file = f"{module}.py"
+    if next(_iter_project_entries(project_dir, lambda name: name in (module, module_file), include_dirs=True), None):
+        return None
+    requirements = next((p for p in (project_dir / "backend" / "requirements.txt", project_dir / "requirements.txt")
+                         if p.exists()), None)
+    if requirements is None:
+        return None
+    
+    content = requirements.read_text(encoding='utf-8')
+    listed = set()
+    for line in content.splitlines():
+        name_match = _REQUIREMENT_NAME_RE.match(line)
+        if name_match:
+            listed.add(name_match.group(1).lower().replace('_', '-'))
+    if package.split('[')[0].lower().replace('_', '-') in listed:
+        return None
+    
+    with open(requirements, 'w', encoding='utf-8') as f:
+        f.write(content + ('' if not content or content.endswith('\n') else '\n') + package + '\n')
+    logger.info(f"Proactively added {package} to {requirements}")
+    return str(requirements), f"Added '{package}' to {requirements}"
+
+def _fill_empty_block(project_dir: Path, match: re.Match, error_text: str) -> Optional[tuple]:
+    """IndentationError: expected an indented block - add 'pass' to the empty block"""
+    line_match = _EMPTY_BLOCK_LINE_RE.search(match.string)
+    # The first frame is the outermost importer (e.g. uvicorn); the line number belongs
+    # to the innermost one
+    frames = _TRACEBACK_FRAME_FILE_RE.findall(error_text)
+    found_file = frames[-1] if frames else _extract_error_file(error_text)
+    if not line_match or not found_file:
+        return None
+    # Traceback paths are often absolute container paths - only ever edit project files
+    project_root = project_dir.resolve()
+    path = next((p for p in _candidate_error_paths(project_dir, found_file)
+                 if p.is_file() and p.resolve().is_relative_to(project_root)), None)
+    if path is None:
+        return None
+    
+    lines = path.read_text(encoding='utf-8').split('\n')
+    header_idx = int(line_match.group(1)) - 1
+    if not 0 <= header_idx < len(lines) or not lines[header_idx].rstrip().endswith(':'):
+        return None
+    header = lines[header_idx]
+    indent = header[:len(header) - len(header.lstrip())]
+    # Only fix a block that really is empty (next code line is not indented deeper)
+    for line in lines[header_idx + 1:]:
+        if line.strip() and not line.strip().startswith('#'):
+            if len(line) - len(line.lstrip()) > len(indent):
+                return None
+            break
+    lines.insert(header_idx + 1, f"{indent}    pass")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+    logger.info(f"Proactively filled empty block in {path} (line {header_idx + 1})")
+    return str(path), f"Added 'pass' to the empty block on line {header_idx + 1} of {path}"
+
+def _close_unclosed_try(project_dir: Path, match: re.Match, error_text: str) -> Optional[tuple]:
+    """SyntaxError: expected 'except' or 'finally' block"""
+    fixed_path = _fix_unclosed_try_blocks(project_dir)
+    if fixed_path is None:
+        return None
+    return fixed_path, f"Added 'except Exception as e: pass' block to try statement in {fixed_path}"
+
+# Error classes with a deterministic local fix, tried in order before asking the LLM:
+# (error pattern, fixer, issue_identified, root_cause, explanation). A fixer gets the
+# project directory, the pattern match and the traceback/message text, and returns
+# (fixed file path, fix description) or None if it could not apply its fix
+_PROACTIVE_FIXERS = (
+    (re.compile(r"expected 'except' or 'finally' block|expected except|expected finally", re.IGNORECASE),
+     _close_unclosed_try,
+     "SyntaxError: expected 'except' or 'finally' block",
+     "A try block was found without a corresponding except or finally block",
+     "The try block was missing an except or finally clause. Added an except block to handle exceptions."),
+    (re.compile(r"ModuleNotFoundError: No module named '([\w.]+)'"),
+     _add_missing_requirement,
+     "ModuleNotFoundError: missing Python package",
+     "The application imports a module whose package is not listed in requirements.txt",
+     "Added the missing package to requirements.txt so it is installed when the container is rebuilt."),
+    (re.compile(r"IndentationError: expected an indented block"),
+     _fill_empty_block,
+     "IndentationError: expected an indented block",
+     "A block statement (def, if, for, ...) has no body",
+     "Added a 'pass' statement as the body of the empty block."),
+)
+
+def _apply_proactive_fix(project_dir: Path, error_message: str, error_traceback: Optional[str]) -> Optional[dict]:
+    """Apply the first matching local fix from _PROACTIVE_FIXERS; None if none applies"""
+    error_text = error_traceback or error_message
+    for pattern, fixer, issue, root_cause, explanation in _PROACTIVE_FIXERS:
+        match = pattern.search(error_message) or (error_traceback and pattern.search(error_traceback))
+        if not match:
+            continue
+        try:
+            fixed = fixer(project_dir, match, error_text)
+        except Exception as e:
+            logger.warning(f"Proactive fix for '{issue}' failed: {e}")
+            continue
+        if fixed:
+            fixed_path, description = fixed
+            return {
+                "issue_identified": issue,
+                "root_cause": root_cause,
+                "fix_code": description,
+                "file_path": fixed_path,
+                "explanation": explanation,
+            }
+    return None
+
 def apply_fix_to_file(file_path: str, fix_code: str) -> bool:
     """Apply the fix code to the actual file."""
     try:
@@ -2141,8 +2789,7 @@ def apply_fix_to_file(file_path: str, fix_code: str) -> bool:
             return False
         
         # Write the fix code to the file
-        with open(file_path_obj, 'w') as f:
-            f.write(fix_code)
+        file_path_obj.write_text(fix_code, encoding='utf-8')
         
         logger.info(f"Successfully applied fix to {file_path}")
         return True
@@ -2150,6 +2797,37 @@ def apply_fix_to_file(file_path: str, fix_code: str) -> bool:
         logger.error(f"Error applying fix to {file_path}: {e}")
         return False
 
+_DOCKER_STDERR_TAIL_LINES = 20
+
+def _run_keeping_stderr_tail(cmd: List[str], cwd: Path, timeout: int) -> tuple[int, str]:
+    """Run a command, discarding stdout and keeping only the last lines of stderr.
+
+    Docker build logs can run to megabytes; streaming them through a bounded
+    deque avoids buffering the whole log just to report the end of it.
+    Raises subprocess.TimeoutExpired like subprocess.run does.
+    """
+    tail = deque(maxlen=_DOCKER_STDERR_TAIL_LINES)
+    with subprocess.Popen(
+        cmd,
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors='replace'
+    ) as proc:
+        timer = threading.Timer(timeout, proc.kill)
+        timer.start()
+        try:
+            for line in proc.stderr:
+                tail.append(line.rstrip('\n'))
+            returncode = proc.wait()
+        finally:
+            timed_out = not timer.is_alive()
+            timer.cancel()
+    if timed_out:
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    return returncode, "\n".join(tail)
+
 def rebuild_docker_containers(project_dir: Path) -> tuple[bool, Optional[str]]:
     """Rebuild Docker containers for the project."""
     try:
@@ -2161,35 +2839,22 @@ def rebuild_docker_containers(project_dir: Path) -> tuple[bool, Optional[str]]:
         subprocess.run(
             docker_cmd + ['down'],
             cwd=project_dir,
-            capture_output=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
             timeout=30
         )
         
         # Rebuild containers
-        build_result = subprocess.run(
-            docker_cmd + ['build'],
-            cwd=project_dir,
-            capture_output=True,
-            text=True,
-            timeout=300
-        )
-        
-        if build_result.returncode != 0:
-            logger.error(f"Docker build failed: {build_result.stderr}")
-            return False, build_result.stderr[:500]
+        returncode, stderr_tail = _run_keeping_stderr_tail(docker_cmd + ['build'], project_dir, 300)
+        if returncode != 0:
+            logger.error(f"Docker build failed: {stderr_tail}")
+            return False, stderr_tail
         
         # Start containers
-        start_result = subprocess.run(
-            docker_cmd + ['up', '-d'],
-            cwd=project_dir,
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        
-        if start_result.returncode != 0:
-            logger.error(f"Docker start failed: {start_result.stderr}")
-            return False, start_result.stderr[:500]
+        returncode, stderr_tail = _run_keeping_stderr_tail(docker_cmd + ['up', '-d'], project_dir, 60)
+        if returncode != 0:
+            logger.error(f"Docker start failed: {stderr_tail}")
+            return False, stderr_tail
         
         logger.info(f"Successfully rebuilt Docker containers for {project_dir}")
         return True, None
@@ -2197,143 +2862,120 @@ def rebuild_docker_containers(project_dir: Path) -> tuple[bool, Optional[str]]:
         logger.error(f"Error rebuilding Docker: {e}")
         return False, str(e)
 
-@router.post("/debug-fix", response_model=DebugResponse)
+# Patterns for the local fallback fixes in debug_and_fix, compiled once rather than
+# looked up in re's cache on every request
+# The quoted name is capped at 128 characters: an unbounded [^'"]+ rescans to the end of
+# the text from every quote when there is no closing one, which is quadratic on long
+# LLM-written issue strings
+_UNDEFINED_NAME_RE = re.compile(r"undefined.*?['\"]([^'\"]{1,128})['\"]")
+_NOT_DEFINED_NAME_RE = re.compile(r"['\"]([^'\"]{1,128})['\"].*?not defined")
+_COMPONENT_FUNCTION_RE = re.compile(r'(function\s+\w+\s*\([^)]*\)\s*\{)')
+_JS_IMPORT_RE = re.compile(r'import[^;]+;')
+
+# Docker rebuilds started by /debug-fix run after the response is sent; clients poll
+# /debug-fix/status/{job_id}. job id -> job state, oldest first, bounded like the
+# error-fix cache
+_REBUILD_JOBS: Dict[str, Dict[str, Any]] = {}
+_REBUILD_JOBS_MAX = 256
+# One build at a time per project: a job queued while another build of the same
+# project runs waits here, still "pending", and then builds with every fix written so far
+_REBUILD_LOCKS: Dict[Path, threading.Lock] = {}
+
+def _start_rebuild_job(background_tasks: BackgroundTasks, project_dir: Path, user_id: int,
+                       application_url: Optional[str]) -> str:
+    """
+    Queue a Docker rebuild of project_dir after the response and return its job id.
+    A request while a rebuild of the project is still queued gets that job back, as
+    the queued build will pick up its fix. A build already running may have read its
+    context before this fix was written, so then a new job is queued behind it.
+    """
+    for job_id, job in reversed(_REBUILD_JOBS.items()):
+        if job["project_dir"] == project_dir and job["status"] == "pending" and job["user_id"] == user_id:
+            return job_id
+    if len(_REBUILD_JOBS) >= _REBUILD_JOBS_MAX:
+        _REBUILD_JOBS.pop(next(iter(_REBUILD_JOBS)), None)
+    job_id = uuid.uuid4().hex
+    job = {"user_id": user_id, "project_dir": project_dir, "status": "pending", "docker_rebuilt": False,
+           "error": None, "application_url": None}
+    _REBUILD_JOBS[job_id] = job
+    background_tasks.add_task(_run_rebuild_job, job, project_dir, application_url)
+    return job_id
+
+def _run_rebuild_job(job: Dict[str, Any], project_dir: Path, application_url: Optional[str]) -> None:
+    """Background task body: rebuild and record the outcome on the job"""
+    with _REBUILD_LOCKS.setdefault(project_dir, threading.Lock()):
+        job["status"] = "running"
+        docker_rebuilt, error_msg = rebuild_docker_containers(project_dir)
+    if docker_rebuilt:
+        job.update(status="done", docker_rebuilt=True, application_url=application_url)
+    else:
+        logger.warning(f"Docker rebuild failed: {error_msg}")
+        job.update(status="failed", error=error_msg)
+
+def _project_application_url(db: Session, project_id: int, user_id: int) -> Optional[str]:
+    """The user's project application URL, reported once its rebuild has finished"""
+    project = db.query(models.Project).filter(
+        models.Project.id == project_id,
+        models.Project.user_id == user_id
+    ).first()
+    return project.application_url if project else None
+
+# How debug_and_fix tells an LLM fix_code that is prose ("Ensure the handler ...") from
+# actual code: explanation openings, and tokens of which real code has at least one
+_EXPLANATION_PREFIXES = ("ensure", "you need", "please")
+_CODE_TOKENS = ("function", "const", "import", "def ", "class ", "export")
+_VALID_CODE_TOKENS = _CODE_TOKENS + ("return", "{", "(")
+
+def _fix_code_head(fix_code: str) -> str:
+    """Lowercased start of fix_code - enough for the prefix checks without copying it whole"""
+    return fix_code.lstrip()[:8].lower()
+
+@router.post("/debug-fix", response_model=DebugResponse, response_class=_JSON_RESPONSE_CLASS)
 async def debug_and_fix(
     request: DebugRequest,
+    background_tasks: BackgroundTasks,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Analyze an error message, generate a fix, apply it to the generated project,
-    and rebuild Docker containers.
+    and rebuild Docker containers. The rebuild can take minutes, so it runs after
+    the response; poll /debug-fix/status/{rebuild_job_id} for its outcome.
     Example: "JSONDecodeError: Expecting property name enclosed in double quotes"
     """
     try:
-        # PROACTIVE FIX: Check for common errors and fix them immediately before calling LLM
-        error_msg_lower = request.error_message.lower()
-        fix_applied_proactive = False
-        actual_file_path_proactive = None
+        # Several branches below need the generated project's directory; glob for it once.
+        # The slow steps (project scans, the LLM call, docker rebuilds) run in the
+        # threadpool so one debug request doesn't stall the server
+        resolved_project_dir = await run_in_threadpool(_find_project_dir, request.project_id)
         
-        # Handle "expected 'except' or 'finally' block" error proactively
-        if ("expected 'except' or 'finally' block" in error_msg_lower or 
-            "expected except" in error_msg_lower or 
-            "expected finally" in error_msg_lower):
-            
-            if request.project_id:
-                from app.services.code_generator import GENERATED_APPS_DIR
-                base_dir = Path(GENERATED_APPS_DIR)
-                pattern = f"project_{request.project_id}_*"
-                matching_dirs = list(base_dir.glob(pattern))
-                
-                if matching_dirs:
-                    project_dir = matching_dirs[0]
-                    
-                    # Search for Python files in the project
-                    python_files = list(project_dir.rglob("*.py"))
-                    
-                    for py_file in python_files:
-                        try:
-                            with open(py_file, 'r') as f:
-                                content = f.read()
-                            
-                            # Check if this file has a try block without except/finally
-                            lines = content.split('\n')
-                            new_lines = []
-                            modified = False
-                            i = 0
-                            
-                            while i < len(lines):
-                                line = lines[i]
-                                new_lines.append(line)
-                                
-                                # Check if this line starts a try block
-                                if re.match(r'^\s*try\s*:', line):
-                                    # Find the indentation
-                                    indent_match = re.match(r'^(\s*)', line)
-                                    indent = indent_match.group(1) if indent_match else ''
-                                    
-                                    # Look ahead to see if there's an except or finally
-                                    has_except_or_finally = False
-                                    j = i + 1
-                                    while j < len(lines):
-                                        next_line = lines[j]
-                                        # If we hit a line with same or less indentation (not empty), check if it's except/finally
-                                        if next_line.strip() and not next_line.strip().startswith('#'):
-                                            next_indent = len(next_line) - len(next_line.lstrip())
-                                            if next_indent <= len(indent):
-                                                # Check if it's except or finally
-                                                if re.match(r'^\s*(except|finally)', next_line):
-                                                    has_except_or_finally = True
-                                                break
-                                        j += 1
-                                    
-                                    # If no except/finally found, add one
-                                    if not has_except_or_finally:
-                                        # Find where the try block ends (next line with same or less indentation)
-                                        try_block_end = i + 1
-                                        while try_block_end < len(lines):
-                                            next_line = lines[try_block_end]
-                                            if next_line.strip() and not next_line.strip().startswith('#'):
-                                                next_indent = len(next_line) - len(next_line.lstrip())
-                                                if next_indent <= len(indent):
-                                                    break
-                                            try_block_end += 1
-                                        
-                                        # Insert except block at the end of try block
-                                        except_block = f"{indent}except Exception as e:\n{indent}    # Handle error\n{indent}    pass"
-                                        new_lines.append(except_block)
-                                        modified = True
-                                
-                                i += 1
-                            
-                            # If we found and fixed a try block, write it back
-                            if modified:
-                                fixed_content = '\n'.join(new_lines)
-                                with open(py_file, 'w') as f:
-                                    f.write(fixed_content)
-                                
-                                actual_file_path_proactive = str(py_file)
-                                fix_applied_proactive = True
-                                logger.info(f"Proactively fixed try block in {py_file}")
-                                break  # Fix one file at a time
-                        except Exception as e:
-                            logger.warning(f"Error checking file {py_file}: {e}")
-                            continue
+        # PROACTIVE FIX: Known error classes (see _PROACTIVE_FIXERS) are fixed by a local
+        # rule immediately, without calling the LLM
+        proactive_fix = None
+        if request.project_id and resolved_project_dir:
+            proactive_fix = await run_in_threadpool(
+                _apply_proactive_fix, resolved_project_dir, request.error_message, request.error_traceback
+            )
         
         # If we already fixed it proactively, return early
-        if fix_applied_proactive:
-            # Rebuild Docker
-            from app.services.code_generator import GENERATED_APPS_DIR
-            base_dir = Path(GENERATED_APPS_DIR)
-            pattern = f"project_{request.project_id}_*"
-            matching_dirs = list(base_dir.glob(pattern))
-            docker_rebuilt = False
-            application_url = None
-            
-            if matching_dirs:
-                project_dir = matching_dirs[0]
-                docker_rebuilt, error_msg = rebuild_docker_containers(project_dir)
-                
-                if docker_rebuilt:
-                    # Get application URL from database
-                    project = db.query(models.Project).filter(models.Project.id == request.project_id).first()
-                    if project:
-                        application_url = project.application_url
+        if proactive_fix:
+            # Rebuild Docker in the background
+            rebuild_job_id = _start_rebuild_job(
+                background_tasks, resolved_project_dir, current_user.id,
+                _project_application_url(db, request.project_id, current_user.id)
+            )
             
             return DebugResponse(
-                issue_identified="SyntaxError: expected 'except' or 'finally' block",
-                root_cause="A try block was found without a corresponding except or finally block",
-                fix_code=f"Added 'except Exception as e: pass' block to try statement in {actual_file_path_proactive}",
-                file_path=actual_file_path_proactive or "unknown",
-                explanation="The try block was missing an except or finally clause. Added an except block to handle exceptions.",
+                **proactive_fix,
                 confidence=0.95,
                 needs_confirmation=False,
                 fix_applied=True,
-                docker_rebuilt=docker_rebuilt,
-                application_url=application_url
+                rebuild_job_id=rebuild_job_id
             )
         
-        result = analyze_and_fix_error(
+        # File reads, project search and the LLM call all block - run them off the event loop
+        result = await run_in_threadpool(
+            analyze_and_fix_error,
             request.error_message,
             request.error_traceback,
             request.file_path,
@@ -2341,8 +2983,7 @@ async def debug_and_fix(
         )
         
         fix_applied = False
-        docker_rebuilt = False
-        application_url = None
+        rebuild_job_id = None
         
         # If project_id is provided and we have a fix, apply it
         if request.project_id and result.get("fix_code") and result.get("confidence", 0) > 0.5:
@@ -2351,32 +2992,26 @@ async def debug_and_fix(
             
             # If not found, try to resolve from the file_path in result
             if not actual_file_path:
-                from app.services.code_generator import GENERATED_APPS_DIR
-                base_dir = Path(GENERATED_APPS_DIR)
-                pattern = f"project_{request.project_id}_*"
-                matching_dirs = list(base_dir.glob(pattern))
-                
-                if matching_dirs:
-                    project_dir = matching_dirs[0]
+                if resolved_project_dir:
+                    project_dir = resolved_project_dir
                     file_path_from_result = result.get("file_path", "")
                     
                     # Enhanced file path resolution
                     if file_path_from_result:
-                        # Try different possible locations
-                        possible_paths = [
-                            project_dir / file_path_from_result,
-                            project_dir / "backend" / file_path_from_result,
-                            project_dir / "frontend" / file_path_from_result,
-                            project_dir / "frontend" / "src" / file_path_from_result,
-                            project_dir / "backend" / file_path_from_result.replace("app/", ""),
-                        ]
-                        
-                        # Also try extracting filename and searching recursively
+                        # Try different possible locations, then the filename anywhere in
+                        # the project; the search is lazy, so the tree is only walked when
+                        # none of the direct locations exists
                         file_name = Path(file_path_from_result).name
-                        if file_name:
-                            # Recursive search for filename
-                            for found_file in project_dir.rglob(file_name):
-                                possible_paths.append(found_file)
+                        possible_paths = itertools.chain(
+                            (
+                                project_dir / file_path_from_result,
+                                project_dir / "backend" / file_path_from_result,
+                                project_dir / "frontend" / file_path_from_result,
+                                project_dir / "frontend" / "src" / file_path_from_result,
+                                project_dir / "backend" / file_path_from_result.replace("app/", ""),
+                            ),
+                            _iter_files_named(project_dir, file_name) if file_name else (),
+                        )
                         
                         for possible_path in possible_paths:
                             if possible_path.exists():
@@ -2389,68 +3024,47 @@ async def debug_and_fix(
                         search_text = request.error_traceback or request.error_message
                         if search_text:
                             # Use same enhanced extraction as in analyze_and_fix_error
-                            file_patterns = [
-                                r'File\s+["\']([^"\']+\.(py|js|jsx|ts|tsx))["\']',
-                                r'["\']([^"\']+\.(py|js|jsx|ts|tsx))["\']',
-                                r'File\s+([^\s,]+\.(py|js|jsx|ts|tsx))',
-                                r'([^\s,]+\.(py|js|jsx|ts|tsx))',
-                                r'in\s+([^\s,]+\.(py|js|jsx|ts|tsx))',
-                                r'at\s+([^\s,]+\.(py|js|jsx|ts|tsx))',
-                            ]
-                            
-                            found_file = None
-                            for pattern in file_patterns:
-                                file_match = re.search(pattern, search_text, re.IGNORECASE)
-                                if file_match:
-                                    found_file = file_match.group(1).strip('"\'')
-                                    found_file = re.sub(r':\d+$', '', found_file)
-                                    if found_file:
-                                        break
+                            found_file = _extract_error_file(search_text)
                             
                             if found_file:
                                 file_name = Path(found_file).name
                                 # Recursive search
-                                for found_path in project_dir.rglob(file_name):
+                                found_path = _find_file_bfs(project_dir, file_name)
+                                if found_path:
                                     actual_file_path = str(found_path)
                                     logger.info(f"Found file from error message: {actual_file_path}")
-                                    break
             
             if actual_file_path:
-                # Verify the file exists before proceeding
-                if not Path(actual_file_path).exists():
+                # Read the current file content to verify it exists and is the right file;
+                # from here on actual_file_path is only set for a file that was read
+                try:
+                    current_content = Path(actual_file_path).read_text(encoding='utf-8')
+                    logger.info(f"Verified file exists and is readable: {actual_file_path} ({len(current_content)} chars)")
+                except FileNotFoundError:
                     logger.error(f"File does not exist: {actual_file_path}")
                     actual_file_path = None
-                else:
-                    # Read the current file content to verify it's the right file
-                    try:
-                        with open(actual_file_path, 'r') as f:
-                            current_content = f.read()
-                        logger.info(f"Verified file exists and is readable: {actual_file_path} ({len(current_content)} chars)")
-                    except Exception as e:
-                        logger.error(f"Cannot read file {actual_file_path}: {e}")
-                        actual_file_path = None
+                except Exception as e:
+                    logger.error(f"Cannot read file {actual_file_path}: {e}")
+                    actual_file_path = None
             
             if actual_file_path:
                 # Check if fix_code is actually code (not just explanation)
                 fix_code = result.get("fix_code", "")
                 
                 # Check if fix_code is explanation rather than code
+                fix_head = _fix_code_head(fix_code)
                 is_explanation = (
-                    fix_code.strip().lower().startswith("ensure") or
-                    fix_code.strip().lower().startswith("you need") or
-                    fix_code.strip().lower().startswith("please") or
-                    fix_code.strip().lower().startswith("add") and "function" not in fix_code or
+                    fix_head.startswith(_EXPLANATION_PREFIXES) or
+                    fix_head.startswith("add") and "function" not in fix_code or
                     len(fix_code) < 50 or
-                    ("function" not in fix_code and "const" not in fix_code and "import" not in fix_code and 
-                     "def " not in fix_code and "class " not in fix_code and "export" not in fix_code)
+                    not any(token in fix_code for token in _CODE_TOKENS)
                 )
                 
                 # If it's an explanation, try to generate actual fix from the original file
-                if is_explanation and Path(actual_file_path).exists():
+                if is_explanation:
                     try:
-                        # Read the original file
-                        with open(actual_file_path, 'r') as f:
-                            original_content = f.read()
+                        # The file was already read when its path was verified above
+                        original_content = current_content
                         
                         # Try to generate a proper fix based on the error
                         issue = result.get("issue_identified", "").lower()
@@ -2458,63 +3072,14 @@ async def debug_and_fix(
                         
                         # Handle "expected 'except' or 'finally' block" error
                         if "expected 'except' or 'finally' block" in error_msg_lower or "expected except" in error_msg_lower:
-                            fixed_content = original_content
-                            
                             # Find try blocks without except/finally
-                            lines = fixed_content.split('\n')
-                            new_lines = []
-                            i = 0
-                            
-                            while i < len(lines):
-                                line = lines[i]
-                                new_lines.append(line)
-                                
-                                # Check if this line starts a try block
-                                if re.match(r'^\s*try\s*:', line):
-                                    # Find the indentation
-                                    indent_match = re.match(r'^(\s*)', line)
-                                    indent = indent_match.group(1) if indent_match else ''
-                                    
-                                    # Look ahead to see if there's an except or finally
-                                    has_except_or_finally = False
-                                    j = i + 1
-                                    while j < len(lines):
-                                        next_line = lines[j]
-                                        # If we hit a line with same or less indentation (not empty), check if it's except/finally
-                                        if next_line.strip() and not next_line.strip().startswith('#'):
-                                            next_indent = len(next_line) - len(next_line.lstrip())
-                                            if next_indent <= len(indent):
-                                                # Check if it's except or finally
-                                                if re.match(r'^\s*(except|finally)', next_line):
-                                                    has_except_or_finally = True
-                                                break
-                                        j += 1
-                                    
-                                    # If no except/finally found, add one
-                                    if not has_except_or_finally:
-                                        # Find where the try block ends (next line with same or less indentation)
-                                        try_block_end = i + 1
-                                        while try_block_end < len(lines):
-                                            next_line = lines[try_block_end]
-                                            if next_line.strip() and not next_line.strip().startswith('#'):
-                                                next_indent = len(next_line) - len(next_line.lstrip())
-                                                if next_indent <= len(indent):
-                                                    break
-                                            try_block_end += 1
-                                        
-                                        # Insert except block at the end of try block
-                                        except_block = f"{indent}except Exception as e:\n{indent}    # Handle error\n{indent}    pass"
-                                        new_lines.append(except_block)
-                                
-                                i += 1
-                            
-                            fix_code = '\n'.join(new_lines)
+                            fix_code, _ = _add_missing_except_blocks(original_content)
                             logger.info("Added except block to try statement")
                         elif "undefined" in issue or "not defined" in issue:
                             # Extract variable/function name
-                            var_match = re.search(r"undefined.*?['\"]([^'\"]+)['\"]", issue)
-                            if not var_match:
-                                var_match = re.search(r"['\"]([^'\"]+)['\"].*?not defined", issue)
+                            var_match = _UNDEFINED_NAME_RE.search(issue)
+                            if not var_match and "not defined" in issue:
+                                var_match = _NOT_DEFINED_NAME_RE.search(issue)
                             
                             if var_match:
                                 var_name = var_match.group(1)
@@ -2525,30 +3090,21 @@ async def debug_and_fix(
                                     if var_name in original_content:
                                         fixed_content = original_content
                                         
-                                        # Fix the onSubmit/onClick handler - handle different patterns
-                                        # Pattern 1: onSubmit={() => { handleSignup }} (with spaces)
-                                        fixed_content = re.sub(
-                                            rf'onSubmit=\{{\(\)\s*=>\s*{{\s*{re.escape(var_name)}\s*}}\}}',
-                                            f'onSubmit={{{var_name}}}',
-                                            fixed_content
-                                        )
-                                        # Pattern 2: onClick={() => { handleSignup }}
-                                        fixed_content = re.sub(
-                                            rf'onClick=\{{\(\)\s*=>\s*{{\s*{re.escape(var_name)}\s*}}\}}',
-                                            f'onClick={{{var_name}}}',
-                                            fixed_content
-                                        )
-                                        # Pattern 3: Any handler with the variable
-                                        fixed_content = re.sub(
-                                            rf'(\w+)=\{{\(\)\s*=>\s*{{\s*{re.escape(var_name)}\s*}}\}}',
-                                            rf'\1={{{var_name}}}',
-                                            fixed_content
-                                        )
+                                        # Unwrap inline arrow handlers around the name, e.g.
+                                        # onSubmit={() => { handleSignup }} -> onSubmit={handleSignup}.
+                                        # One pass for every attribute (onSubmit, onClick, ...); files
+                                        # without '=>' have no such handler and skip the scan
+                                        if '=>' in fixed_content:
+                                            fixed_content = re.sub(
+                                                rf'(\w+)=\{{\(\)\s*=>\s*{{\s*{re.escape(var_name)}\s*}}\}}',
+                                                rf'\1={{{var_name}}}',
+                                                fixed_content
+                                            )
                                         
                                         # Add function definition if it doesn't exist
                                         if f"const {var_name}" not in fixed_content and f"function {var_name}" not in fixed_content:
                                             # Find the component function (function ComponentName() or const ComponentName =)
-                                            component_match = re.search(r'(function\s+\w+\s*\([^)]*\)\s*\{)', fixed_content)
+                                            component_match = _COMPONENT_FUNCTION_RE.search(fixed_content)
                                             if component_match:
                                                 # Insert function definition right before the component function
                                                 insert_pos = component_match.start()
@@ -2558,10 +3114,12 @@ async def debug_and_fix(
                                                     fixed_content[insert_pos:]
                                                 )
                                             else:
-                                                # Add after last import statement
-                                                import_lines = [m.end() for m in re.finditer(r'import[^;]+;', fixed_content)]
-                                                if import_lines:
-                                                    last_import_end = max(import_lines)
+                                                # Add after last import statement (matches come in order,
+                                                # so the last one seen ends furthest)
+                                                last_import_end = 0
+                                                for import_match in _JS_IMPORT_RE.finditer(fixed_content):
+                                                    last_import_end = import_match.end()
+                                                if last_import_end:
                                                     fixed_content = (
                                                         fixed_content[:last_import_end] +
                                                         f"\n\nconst {var_name} = (e) => {{\n  e.preventDefault();\n  // Add your logic here\n}};\n" +
@@ -2582,67 +3140,12 @@ async def debug_and_fix(
                                 
                                 # For Python files
                                 elif actual_file_path.endswith('.py'):
-                                    # Check for syntax errors first
-                                    issue_lower = issue.lower()
-                                    error_msg_lower_py = request.error_message.lower()
-                                    
-                                    # Handle "expected 'except' or 'finally' block" error
-                                    if ("expected 'except' or 'finally' block" in issue_lower or "expected except" in issue_lower or
-                                        "expected 'except' or 'finally' block" in error_msg_lower_py or "expected except" in error_msg_lower_py):
+                                    # Check for syntax errors first. issue is already lowercased, and the
+                                    # error message was ruled out by the outer "expected except" check
+                                    if "expected 'except' or 'finally' block" in issue or "expected except" in issue:
                                         # Find try blocks without except/finally
-                                        fixed_content = original_content
-                                        
-                                        # Pattern: try: ... (without except or finally)
-                                        # Find all try blocks
-                                        try_pattern = r'try\s*:'
-                                        try_matches = list(re.finditer(try_pattern, fixed_content))
-                                        
-                                        for try_match in reversed(try_matches):  # Process from end to start
-                                            try_start = try_match.end()
-                                            # Find the end of the try block (next except, finally, or function/class definition)
-                                            remaining = fixed_content[try_start:]
-                                            
-                                            # Check if there's an except or finally after this try
-                                            has_except = re.search(r'^\s*except', remaining, re.MULTILINE)
-                                            has_finally = re.search(r'^\s*finally', remaining, re.MULTILINE)
-                                            
-                                            if not has_except and not has_finally:
-                                                # Find the indentation level of the try block
-                                                try_line_start = fixed_content.rfind('\n', 0, try_match.start()) + 1
-                                                try_line = fixed_content[try_line_start:try_match.end()]
-                                                indent_match = re.match(r'^(\s*)', try_line)
-                                                indent = indent_match.group(1) if indent_match else ''
-                                                
-                                                # Find where the try block ends (next line at same or less indentation, or end of function)
-                                                lines = remaining.split('\n')
-                                                try_block_end = 0
-                                                for i, line in enumerate(lines[1:], 1):  # Skip first line (already part of try)
-                                                    stripped = line.lstrip()
-                                                    if not stripped or stripped.startswith('#'):
-                                                        continue
-                                                    line_indent = len(line) - len(line.lstrip())
-                                                    try_indent = len(indent)
-                                                    # If line has same or less indentation and is not empty, try block ends
-                                                    if line_indent <= try_indent and stripped:
-                                                        try_block_end = i
-                                                        break
-                                                
-                                                if try_block_end == 0:
-                                                    # Try block goes to end of function or file
-                                                    # Find next def, class, or end of file
-                                                    next_def = re.search(r'\n\s*(def |class |@)', remaining)
-                                                    if next_def:
-                                                        try_block_end = remaining[:next_def.start()].count('\n')
-                                                    else:
-                                                        try_block_end = len(lines) - 1
-                                                
-                                                # Insert except block
-                                                insert_pos = try_start + sum(len(lines[i]) + 1 for i in range(try_block_end))
-                                                except_block = f"\n{indent}except Exception as e:\n{indent}    # Handle error\n{indent}    pass"
-                                                fixed_content = fixed_content[:insert_pos] + except_block + fixed_content[insert_pos:]
-                                                logger.info("Added except block to try statement")
-                                        
-                                        fix_code = fixed_content
+                                        fix_code, _ = _add_missing_except_blocks(original_content)
+                                        logger.info("Added except block to try statement")
                                     # Add function definition for undefined variables
                                     elif f"def {var_name}" not in original_content:
                                         # Find where to insert (after imports, before first function)
@@ -2663,41 +3166,22 @@ async def debug_and_fix(
                 # Validate fix_code is actual code
                 is_valid_code = (
                     len(fix_code) > 50 and
-                    not fix_code.strip().lower().startswith("ensure") and
-                    not fix_code.strip().lower().startswith("you need") and
-                    not fix_code.strip().lower().startswith("please") and
-                    ("function" in fix_code or "const" in fix_code or "import" in fix_code or 
-                     "def " in fix_code or "class " in fix_code or "export" in fix_code or
-                     "return" in fix_code or "{" in fix_code or "(" in fix_code)
+                    not _fix_code_head(fix_code).startswith(_EXPLANATION_PREFIXES) and
+                    any(token in fix_code for token in _VALID_CODE_TOKENS)
                 )
                 
                 if is_valid_code:
                     # Apply the fix
-                    fix_applied = apply_fix_to_file(actual_file_path, fix_code)
+                    fix_applied = await run_in_threadpool(apply_fix_to_file, actual_file_path, fix_code)
                     
                     if fix_applied:
                         logger.info(f"Fix applied to {actual_file_path}")
-                        # Rebuild Docker containers
-                        from app.services.code_generator import GENERATED_APPS_DIR
-                        base_dir = Path(GENERATED_APPS_DIR)
-                        pattern = f"project_{request.project_id}_*"
-                        matching_dirs = list(base_dir.glob(pattern))
-                        
-                        if matching_dirs:
-                            project_dir = matching_dirs[0]
-                            docker_rebuilt, error_msg = rebuild_docker_containers(project_dir)
-                            
-                            if docker_rebuilt:
-                                # Get application URL from project
-                                project = db.query(models.Project).filter(
-                                    models.Project.id == request.project_id,
-                                    models.Project.user_id == current_user.id
-                                ).first()
-                                
-                                if project and project.application_url:
-                                    application_url = project.application_url
-                            else:
-                                logger.warning(f"Docker rebuild failed: {error_msg}")
+                        # Rebuild Docker containers in the background
+                        if resolved_project_dir:
+                            rebuild_job_id = _start_rebuild_job(
+                                background_tasks, resolved_project_dir, current_user.id,
+                                _project_application_url(db, request.project_id, current_user.id)
+                            )
                     else:
                         logger.warning(f"Failed to apply fix to {actual_file_path}")
                 else:
@@ -2716,8 +3200,7 @@ async def debug_and_fix(
             confidence=result.get("confidence", 0.5),
             needs_confirmation=False,  # Auto-apply if confidence is high
             fix_applied=fix_applied,
-            docker_rebuilt=docker_rebuilt,
-            application_url=application_url
+            rebuild_job_id=rebuild_job_id
         )
     except Exception as e:
         logger.error(f"Error in debug-fix endpoint: {e}", exc_info=True)
@@ -2726,6 +3209,22 @@ async def debug_and_fix(
             detail=f"Failed to analyze error: {str(e)}"
         )
 
+@router.get("/debug-fix/status/{job_id}", response_model=RebuildStatusResponse)
+async def debug_fix_status(
+    job_id: str,
+    current_user: models.User = Depends(get_current_user)
+):
+    """Outcome of a Docker rebuild started by /debug-fix"""
+    job = _REBUILD_JOBS.get(job_id)
+    if job is None or job["user_id"] != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rebuild job not found")
+    return RebuildStatusResponse(
+        status=job["status"],
+        docker_rebuilt=job["docker_rebuilt"],
+        error=job["error"],
+        application_url=job["application_url"]
+    )
+
 @router.post("/generate-form-api", response_model=FormAPIResponse)
 async def generate_form_api_endpoint(
     request: FormAPIRequest,
@@ -1,14 +1,25 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator, Tuple
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from app.auth import get_current_user
 from app import models
 from app.services.prebuilt_components import find_matching_prebuilt_component
 from app.services.mcp_server import call_mcp_models
+from app.services.http_client import http_session
+from app.services.settings_loader import (
+    get_mcp_enabled, get_mcp_strategy, get_use_ollama, get_ollama_url, get_ollama_model,
+    get_ollama_timeout, get_openai_api_key, get_anthropic_api_key
+)
+from app.services.llm_cache import (
+    MAX_CACHEABLE_TEMPERATURE, llm_cache_key, get_cached_response, cache_response
+)
 import os
 import json
 import re
 import logging
+import time
 import requests
 
 logger = logging.getLogger(__name__)
@@ -64,7 +75,7 @@ def get_available_ollama_models(ollama_url: str = "http://localhost:11434") -> L
     Get list of available Ollama models.
     """
     try:
-        response = requests.get(f"{ollama_url}/api/tags", timeout=5)
+        response = http_session.get(f"{ollama_url}/api/tags", timeout=5)
         if response.status_code == 200:
             data = response.json()
             models = [model.get("name", "") for model in data.get("models", [])]
@@ -73,6 +84,24 @@ def get_available_ollama_models(ollama_url: str = "http://localhost:11434") -> L
         logger.warning(f"Could not fetch Ollama models: {e}")
     return []
 
+# Sampling options for every Ollama generate request
+_OLLAMA_OPTIONS = {
+    "temperature": 0.3,  # Lower temperature for more accurate, deterministic responses
+    "top_p": 0.9,  # Nucleus sampling for better quality
+    "top_k": 40,  # Limit vocabulary for more focused responses
+    "repeat_penalty": 1.1  # Reduce repetition
+}
+
+def _ollama_cache_key(ollama_model: str, strategy: Optional[str], system_prompt: Optional[str],
+                      prompt: str) -> Optional[str]:
+    """Response cache key for an Ollama request, or None if its answers are not cacheable."""
+    if _OLLAMA_OPTIONS["temperature"] > MAX_CACHEABLE_TEMPERATURE:
+        return None
+    return llm_cache_key(
+        backend="ollama", model=ollama_model, mcp_strategy=strategy,
+        system=system_prompt, prompt=prompt, options=_OLLAMA_OPTIONS
+    )
+
 def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-coder", timeout: int = None) -> Optional[str]:
     """
     Call Ollama LLM API running locally.
@@ -96,22 +125,29 @@ def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-c
         timeout: Request timeout in seconds (default: from env or 300 for large requests)
     """
     # Check if MCP is enabled
-    from app.services.settings_loader import get_mcp_enabled, get_mcp_strategy
     use_mcp = get_mcp_enabled()
+    strategy = get_mcp_strategy() if use_mcp else None
+    ollama_model = get_ollama_model() or model
+    
+    # Identical requests are answered from the response cache (see app.services.llm_cache)
+    cache_key = _ollama_cache_key(ollama_model, strategy, system_prompt, prompt)
+    if cache_key:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            return cached
     
     if use_mcp:
         # Use MCP server for multi-model consensus
-        strategy = get_mcp_strategy()
         mcp_response = call_mcp_models(prompt, system_prompt, strategy=strategy)
         if mcp_response:
+            if cache_key:
+                cache_response(cache_key, mcp_response)
             return mcp_response
         # Fallback to single model if MCP fails
         logger.warning("MCP consensus failed, falling back to single model")
     
     # Single model fallback (original behavior)
-    from app.services.settings_loader import get_ollama_url, get_ollama_model, get_ollama_timeout
     ollama_url = get_ollama_url()
-    ollama_model = get_ollama_model() or model
     
     # Use provided timeout, or from env, or default based on request size
     if timeout is None:
@@ -131,12 +167,7 @@ def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-c
                 "model": ollama_model,
                 "prompt": prompt,
                 "stream": False,
-                "options": {
-                    "temperature": 0.3,  # Lower temperature for more accurate, deterministic responses
-                    "top_p": 0.9,  # Nucleus sampling for better quality
-                    "top_k": 40,  # Limit vocabulary for more focused responses
-                    "repeat_penalty": 1.1  # Reduce repetition
-                }
+                "options": _OLLAMA_OPTIONS
             }
             
             if system_prompt:
@@ -144,7 +175,7 @@ def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-c
             
             logger.info(f"Calling Ollama API (attempt {attempt + 1}/{max_retries + 1}, timeout: {timeout}s, prompt size: {len(prompt)} chars)")
             
-            response = requests.post(
+            response = http_session.post(
                 f"{ollama_url}/api/generate",
                 json=payload,
                 timeout=timeout
@@ -152,7 +183,10 @@ def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-c
             
             if response.status_code == 200:
                 result = response.json()
-                return result.get("response", "")
+                text = result.get("response", "")
+                if cache_key:
+                    cache_response(cache_key, text)
+                return text
             elif response.status_code == 404:
                 # Model not found - provide helpful error message
                 error_data = response.json() if response.content else {}
@@ -180,7 +214,6 @@ def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-c
         except requests.exceptions.Timeout as e:
             if attempt < max_retries:
                 logger.warning(f"Ollama API timeout (attempt {attempt + 1}/{max_retries + 1}). Retrying in {retry_delay}s...")
-                import time
                 time.sleep(retry_delay)
                 retry_delay *= 2  # Exponential backoff
                 timeout = int(timeout * 1.5)  # Increase timeout for retry
@@ -192,7 +225,6 @@ def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-c
         except requests.exceptions.ConnectionError:
             if attempt < max_retries:
                 logger.warning(f"Connection error (attempt {attempt + 1}/{max_retries + 1}). Retrying in {retry_delay}s...")
-                import time
                 time.sleep(retry_delay)
                 retry_delay *= 2
                 continue
@@ -205,7 +237,6 @@ def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-c
         except requests.exceptions.RequestException as e:
             if attempt < max_retries:
                 logger.warning(f"Request error (attempt {attempt + 1}/{max_retries + 1}): {e}. Retrying in {retry_delay}s...")
-                import time
                 time.sleep(retry_delay)
                 retry_delay *= 2
                 continue
@@ -218,6 +249,74 @@ def call_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-c
     
     return None
 
+# Appended when a stream breaks off after some text was sent, so a cut-off answer is
+# not mistaken for a complete one (the HTTP status has already gone out as 200)
+STREAM_INTERRUPTED_MARKER = "\n// [generation interrupted]\n"
+
+def stream_ollama(prompt: str, system_prompt: str = None, model: str = "deepseek-coder",
+                  timeout: int = None) -> Iterator[str]:
+    """
+    Stream an Ollama completion as text chunks, as the model produces them.
+    
+    Unlike call_ollama there is no MCP consensus and no retry: chunks already sent
+    cannot be taken back. Yields nothing if Ollama cannot be reached, and ends with
+    STREAM_INTERRUPTED_MARKER if the stream breaks off part way. A completed answer is
+    stored in the same response cache call_ollama uses.
+    """
+    ollama_model = get_ollama_model() or model
+    cache_key = _ollama_cache_key(ollama_model, None, system_prompt, prompt)
+    if cache_key:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            yield cached
+            return
+    
+    payload = {
+        "model": ollama_model,
+        "prompt": prompt,
+        "stream": True,
+        "options": _OLLAMA_OPTIONS
+    }
+    if system_prompt:
+        payload["system"] = system_prompt
+    
+    # With stream=True the timeout bounds the wait for each chunk, not the whole answer
+    if timeout is None:
+        timeout = get_ollama_timeout()
+    
+    logger.info(f"Streaming from Ollama (timeout: {timeout}s, prompt size: {len(prompt)} chars)")
+    chunks = []
+    done = False
+    try:
+        with http_session.post(f"{get_ollama_url()}/api/generate", json=payload, stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                logger.error(f"Ollama API error: {response.status_code} - {response.text}")
+                return
+            # Ollama sends one JSON object per line: {"response": "<tokens>", "done": false, ...}
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    logger.error(f"Ollama API error: {data['error']}")
+                    break
+                text = data.get("response", "")
+                if text:
+                    chunks.append(text)
+                    yield text
+                if data.get("done"):
+                    done = True
+                    break
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error(f"Error streaming from Ollama: {e}")
+    
+    if done:
+        if cache_key:
+            cache_response(cache_key, "".join(chunks))
+    elif chunks:
+        logger.warning(f"Ollama stream ended early after {len(chunks)} chunks")
+        yield STREAM_INTERRUPTED_MARKER
+
 def call_llm_api(prompt: str, system_prompt: str = None, model: str = "deepseek-coder") -> Optional[str]:
     """
     Call LLM API (Ollama with DeepSeek Coder, OpenAI, Anthropic, etc.)
@@ -226,7 +325,6 @@ def call_llm_api(prompt: str, system_prompt: str = None, model: str = "deepseek-
     Default: DeepSeek Coder via Ollama for better code generation accuracy
     """
     # Check if Ollama is enabled (default to true for local development)
-    from app.services.settings_loader import get_use_ollama, get_ollama_model
     use_ollama = get_use_ollama()
     
     if use_ollama:
@@ -237,7 +335,6 @@ def call_llm_api(prompt: str, system_prompt: str = None, model: str = "deepseek-
             return ollama_response
     
     # Check if OpenAI API key is available
-    from app.services.settings_loader import get_openai_api_key, get_anthropic_api_key
     openai_api_key = get_openai_api_key()
     anthropic_api_key = get_anthropic_api_key()
     
@@ -286,13 +383,10 @@ def call_llm_api(prompt: str, system_prompt: str = None, model: str = "deepseek-
     # Fallback: Return a message indicating LLM is not configured
     return None
 
-def generate_code_with_llm(description: str, component_type: Optional[str] = None, 
-                           language: str = "javascript", context: Optional[Dict] = None,
-                           frontend_framework: Optional[str] = None,
-                           backend_framework: Optional[str] = None) -> Dict[str, Any]:
-    """
-    Generate code using CodeLlama LLM based on description and project frameworks.
-    """
+def _build_code_prompts(description: str, component_type: Optional[str], language: str,
+                        context: Optional[Dict], frontend_framework: Optional[str],
+                        backend_framework: Optional[str]) -> Tuple[str, str]:
+    """System prompt and user prompt for generating code from a description."""
     # Determine language based on framework
     if frontend_framework == 'react':
         actual_language = 'javascript' if language == 'javascript' else 'typescript'
@@ -357,7 +451,18 @@ IMPORTANT:
     if context:
         prompt += f"Additional Context: {json.dumps(context, indent=2)}\n"
     prompt += "\nGenerate the complete code now. Return ONLY the code, nothing else."
+    return system_prompt, prompt
 
+def generate_code_with_llm(description: str, component_type: Optional[str] = None, 
+                           language: str = "javascript", context: Optional[Dict] = None,
+                           frontend_framework: Optional[str] = None,
+                           backend_framework: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Generate code using CodeLlama LLM based on description and project frameworks.
+    """
+    system_prompt, prompt = _build_code_prompts(
+        description, component_type, language, context, frontend_framework, backend_framework
+    )
     llm_response = call_llm_api(prompt, system_prompt)
     
     if llm_response:
@@ -374,17 +479,9 @@ IMPORTANT:
         # Fallback to pattern-based generation
         return generate_code_fallback(description, component_type, language)
 
-def generate_code_fallback(description: str, component_type: Optional[str] = None, 
-                          language: str = "javascript") -> Dict[str, Any]:
-    """
-    Fallback code generation using pattern matching and templates.
-    """
-    lower_desc = description.lower()
-    code = ""
-    
-    if "button" in lower_desc or component_type == "button":
-        if language in ["javascript", "typescript"]:
-            code = """import React from 'react';
+# generate_code_fallback templates, tried in order: (keyword or component type, React code)
+_FALLBACK_CODE_TEMPLATES = (
+    ("button", """import React from 'react';
 
 const Button = ({ onClick, children, style = {} }) => {
   return (
@@ -403,10 +500,8 @@ const Button = ({ onClick, children, style = {} }) => {
   );
 };
 
-export default Button;"""
-    elif "input" in lower_desc or component_type == "input":
-        if language in ["javascript", "typescript"]:
-            code = """import React, { useState } from 'react';
+export default Button;"""),
+    ("input", """import React, { useState } from 'react';
 
 const Input = ({ placeholder, type = 'text', onChange, style = {} }) => {
   const [value, setValue] = useState('');
@@ -432,10 +527,8 @@ const Input = ({ placeholder, type = 'text', onChange, style = {} }) => {
   );
 };
 
-export default Input;"""
-    elif "card" in lower_desc or component_type == "card":
-        if language in ["javascript", "typescript"]:
-            code = """import React from 'react';
+export default Input;"""),
+    ("card", """import React from 'react';
 
 const Card = ({ children, style = {} }) => {
   return (
@@ -453,9 +546,26 @@ const Card = ({ children, style = {} }) => {
   );
 };
 
-export default Card;"""
-    else:
+export default Card;"""),
+)
+_FALLBACK_TEMPLATE_LANGUAGES = ("javascript", "typescript")
+
+def generate_code_fallback(description: str, component_type: Optional[str] = None, 
+                          language: str = "javascript") -> Dict[str, Any]:
+    """
+    Fallback code generation using pattern matching and templates.
+    """
+    lower_desc = description.lower()
+    # First template whose keyword is in the description (or is the component type) wins
+    template = next(
+        (code for kind, code in _FALLBACK_CODE_TEMPLATES if kind in lower_desc or component_type == kind),
+        None
+    )
+    if template is None:
         code = f"// Generated code for: {description}\n// Customize this code based on your needs"
+    else:
+        # The templates are React; other languages get no code for these kinds
+        code = template if language in _FALLBACK_TEMPLATE_LANGUAGES else ""
     
     return {
         "code": code,
@@ -467,6 +577,56 @@ export default Card;"""
         ]
     }
 
+# Markdown code fences around LLM JSON replies
+_FENCE_START_RE = re.compile(r'^```(?:json|javascript|js)?\s*\n?', re.MULTILINE)
+_FENCE_END_RE = re.compile(r'\n?\s*```\s*$', re.MULTILINE)
+# raw_decode parses one JSON value from an offset and ignores whatever follows it
+_JSON_DECODER = json.JSONDecoder()
+
+def _component_candidate(value: Any) -> Optional[Dict[str, Any]]:
+    """
+    value if it looks like a component ('type' and a dict 'props'), or the object inside
+    a single-key wrapper such as {"component": {...}}; None otherwise.
+    """
+    if isinstance(value, dict) and len(value) == 1:
+        inner = next(iter(value.values()))
+        if isinstance(inner, dict):
+            value = inner
+    if isinstance(value, dict) and 'type' in value and isinstance(value.get('props'), dict):
+        return value
+    return None
+
+def _find_component_json(text: str) -> Optional[Dict[str, Any]]:
+    """
+    The first component object in text, decoding from each '{' in turn, so text around
+    the JSON and non-component objects before or around it are skipped.
+    """
+    json_start = text.find('{')
+    while json_start != -1:
+        try:
+            value, _ = _JSON_DECODER.raw_decode(text, json_start)
+        except json.JSONDecodeError:
+            value = None
+        component = _component_candidate(value)
+        if component is not None:
+            return component
+        json_start = text.find('{', json_start + 1)
+    return None
+
+def _llm_route() -> Dict[str, Any]:
+    """Which backend and model call_llm_api would answer with, for cache keys"""
+    if get_use_ollama():
+        return {
+            "backend": "ollama", "model": get_ollama_model() or "deepseek-coder",
+            "mcp_strategy": get_mcp_strategy() if get_mcp_enabled() else None
+        }
+    # Without Ollama the first configured hosted provider answers
+    return {"backend": "openai" if get_openai_api_key() else "anthropic" if get_anthropic_api_key() else None}
+
+def _normalize_description(description: str) -> str:
+    """Description as a cache key: case, runs of whitespace and end punctuation don't matter"""
+    return " ".join(description.lower().split()).strip(" .!?")
+
 def generate_component_with_llm(description: str, component_type: Optional[str] = None,
                                 style_preferences: Optional[Dict] = None,
                                 existing_components: Optional[List] = None,
@@ -491,6 +651,34 @@ def generate_component_with_llm(description: str, component_type: Optional[str]
             "source": "prebuilt"
         }
     framework_name = frontend_framework.upper() if frontend_framework else "React"
+    
+    # The prompt around the description is a fixed template, so "Create a signup form."
+    # and "create a signup form" get the component generated for the first one
+    component_cache_key = llm_cache_key(
+        kind="component", description=_normalize_description(description),
+        component_type=component_type, style_preferences=style_preferences,
+        existing_components=existing_components, frontend_framework=frontend_framework,
+        backend_framework=backend_framework, llm=_llm_route()
+    )
+    
+    def generated(component_structure: Dict[str, Any], cache: bool = True) -> Dict[str, Any]:
+        if cache:
+            cache_response(component_cache_key, json.dumps(component_structure))
+        return {
+            "result": component_structure,
+            "explanation": f"Generated {framework_name} component structure using AI.",
+            "suggestions": [
+                "Review the generated structure",
+                "Adjust styles and properties as needed",
+                "Test the component in your editor"
+            ]
+        }
+    
+    cached_component = get_cached_response(component_cache_key)
+    if cached_component is not None:
+        # Parsed per request, so callers can modify the result freely
+        return generated(json.loads(cached_component), cache=False)
+    
     framework_notes = ""
     if frontend_framework == 'vue':
         framework_notes = "Note: Generate components that can be mapped to Vue.js. Use standard HTML elements that work with Vue."
@@ -637,78 +825,32 @@ NOW GENERATE THE COMPONENT FOR: {description}
                 logger.warning(f"LLM response appears to be just the description. Using fallback.")
                 return generate_component_fallback(description, component_type, style_preferences, frontend_framework)
             
-            # Clean the response - remove markdown code blocks if present
-            cleaned_response = llm_response.strip()
-            
-            # Remove markdown code blocks (more aggressive cleaning)
-            cleaned_response = re.sub(r'^```(?:json|javascript|js)?\s*\n?', '', cleaned_response, flags=re.MULTILINE)
-            cleaned_response = re.sub(r'\n?\s*```\s*$', '', cleaned_response, flags=re.MULTILINE)
-            cleaned_response = cleaned_response.strip()
+            stripped_response = llm_response.strip()
+            component_structure = None
             
-            # Remove any leading/trailing text that's not JSON
-            # Try to find JSON object boundaries
-            json_start = cleaned_response.find('{')
-            json_end = cleaned_response.rfind('}')
-            
-            if json_start != -1 and json_end != -1 and json_end > json_start:
-                cleaned_response = cleaned_response[json_start:json_end + 1]
-            
-            # Try to extract JSON from response - look for complete JSON objects
-            # First try to parse the entire cleaned response
-            try:
-                component_structure = json.loads(cleaned_response)
-                # Validate it's actually a component structure, not just text
-                if isinstance(component_structure, dict) and 'type' in component_structure:
-                    # Additional validation: ensure it's not just the description
-                    if 'props' in component_structure:
-                        # Check if props.children is just the description
-                        props = component_structure.get('props', {})
-                        children = props.get('children', '')
-                        if isinstance(children, str) and children.lower().strip() == cleaned_description:
-                            logger.warning(f"Component children is just the description. Using fallback.")
-                            return generate_component_fallback(description, component_type, style_preferences, frontend_framework)
-                        
-                        # Validate structure is complete
-                        if component_structure.get('type') and isinstance(component_structure.get('props'), dict):
-                            return {
-                                "result": component_structure,
-                                "explanation": f"Generated {framework_name} component structure using AI.",
-                                "suggestions": [
-                                    "Review the generated structure",
-                                    "Adjust styles and properties as needed",
-                                    "Test the component in your editor"
-                                ]
-                            }
-            except json.JSONDecodeError:
-                pass
-            
-            # If direct parse fails, try to extract JSON object using regex
-            json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', cleaned_response, re.DOTALL)
-            if json_match:
+            # Fast path: the reply is already bare JSON
+            if stripped_response.startswith('{') and stripped_response.endswith('}'):
                 try:
-                    component_structure = json.loads(json_match.group())
-                    # Validate it's actually a component structure
-                    if isinstance(component_structure, dict) and 'type' in component_structure and 'props' in component_structure:
-                        # Check if it's not just the description
-                        props = component_structure.get('props', {})
-                        children = props.get('children', '')
-                        if isinstance(children, str) and children.lower().strip() == cleaned_description:
-                            logger.warning(f"Component children is just the description. Using fallback.")
-                            return generate_component_fallback(description, component_type, style_preferences, frontend_framework)
-                        
-                        # Validate structure is complete
-                        if isinstance(component_structure.get('props'), dict):
-                            return {
-                                "result": component_structure,
-                                "explanation": f"Generated {framework_name} component structure using AI.",
-                                "suggestions": [
-                                    "Review the generated structure",
-                                    "Adjust styles and properties as needed",
-                                    "Test the component in your editor"
-                                ]
-                            }
+                    component_structure = _component_candidate(json.loads(stripped_response))
                 except json.JSONDecodeError:
                     pass
+            
+            if component_structure is None:
+                # Remove markdown code blocks, then look for the component object in the
+                # reply, ignoring any text around it
+                cleaned_response = _FENCE_START_RE.sub('', stripped_response)
+                cleaned_response = _FENCE_END_RE.sub('', cleaned_response)
+                component_structure = _find_component_json(cleaned_response)
+            
+            if component_structure is not None:
+                # Check if props.children is just the description
+                props = component_structure.get('props', {})
+                children = props.get('children', '')
+                if isinstance(children, str) and children.lower().strip() == cleaned_description:
+                    logger.warning(f"Component children is just the description. Using fallback.")
+                    return generate_component_fallback(description, component_type, style_preferences, frontend_framework)
+                
+                return generated(component_structure)
         except (json.JSONDecodeError, KeyError, AttributeError) as e:
             logger.warning(f"Failed to parse LLM response as JSON: {e}")
             logger.debug(f"LLM response was: {llm_response[:500]}")
@@ -1692,8 +1834,8 @@ REQUIREMENTS:
             cleaned_response = llm_response.strip()
             
             # Remove markdown code blocks
-            cleaned_response = re.sub(r'^```(?:json|javascript|js)?\s*\n?', '', cleaned_response, flags=re.MULTILINE)
-            cleaned_response = re.sub(r'\n?\s*```\s*$', '', cleaned_response, flags=re.MULTILINE)
+            cleaned_response = _FENCE_START_RE.sub('', cleaned_response)
+            cleaned_response = _FENCE_END_RE.sub('', cleaned_response)
             cleaned_response = cleaned_response.strip()
             
             # Find JSON array boundaries
@@ -2109,7 +2251,10 @@ async def generate_code(
 ):
     """Generate code based on natural language description, respecting project frameworks."""
     try:
-        result = generate_code_with_llm(
+        # The LLM call blocks for seconds to minutes; the endpoints here run it in the
+        # threadpool so other requests keep being served meanwhile
+        result = await run_in_threadpool(
+            generate_code_with_llm,
             request.description,
             request.component_type,
             request.language,
@@ -2125,6 +2270,37 @@ async def generate_code(
             detail=f"Error generating code: {str(e)}"
         )
 
+def _stream_generated_code(request: CodeGenerationRequest) -> Iterator[str]:
+    """Code for a /generate-code request, yielded in chunks as the model writes it."""
+    system_prompt, prompt = _build_code_prompts(
+        request.description, request.component_type, request.language, request.context,
+        request.frontend_framework, request.backend_framework
+    )
+    if get_use_ollama() and not get_mcp_enabled():
+        streamed = False
+        for chunk in stream_ollama(prompt, system_prompt):
+            streamed = True
+            yield chunk
+        if streamed:
+            return
+    # MCP consensus, the hosted providers and the templates only produce whole answers
+    yield call_llm_api(prompt, system_prompt) or generate_code_fallback(
+        request.description, request.component_type, request.language
+    )["code"]
+
+@router.post("/generate-code/stream")
+async def generate_code_stream(
+    request: CodeGenerationRequest,
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Like /generate-code, but streams the code as plain text while it is generated.
+    The status is sent before generation finishes, so a stream that breaks off part
+    way still returns 200; it then ends with STREAM_INTERRUPTED_MARKER.
+    """
+    # Starlette iterates the sync generator in the threadpool
+    return StreamingResponse(_stream_generated_code(request), media_type="text/plain; charset=utf-8")
+
 @router.post("/generate-component", response_model=AIResponse)
 async def generate_component(
     request: ComponentGenerationRequest,
@@ -2132,7 +2308,8 @@ async def generate_component(
 ):
     """Generate component structure based on description, respecting project frameworks."""
     try:
-        result = generate_component_with_llm(
+        result = await run_in_threadpool(
+            generate_component_with_llm,
             request.description,
             request.component_type,
             request.style_preferences,
@@ -2155,7 +2332,7 @@ async def explain_code(
 ):
     """Explain code functionality using AI."""
     try:
-        result = explain_code_with_llm(request.code, request.language)
+        result = await run_in_threadpool(explain_code_with_llm, request.code, request.language)
         return AIResponse(**result)
     except Exception as e:
         logger.error(f"Error explaining code: {e}")
@@ -2171,7 +2348,7 @@ async def fix_bug(
 ):
     """Fix bugs in code using AI."""
     try:
-        result = fix_bug_with_llm(request.code, request.error_message, request.language)
+        result = await run_in_threadpool(fix_bug_with_llm, request.code, request.error_message, request.language)
         return AIResponse(**result)
     except Exception as e:
         logger.error(f"Error fixing bug: {e}")
@@ -2187,7 +2364,8 @@ async def generate_page(
 ):
     """Generate a complete page structure based on description, respecting project frameworks."""
     try:
-        result = generate_page_with_llm(
+        result = await run_in_threadpool(
+            generate_page_with_llm,
             request.description,
             request.page_type,
             request.style_preferences,
@@ -3095,7 +3273,8 @@ async def generate_application(
 ):
     """Generate a complete multi-page application with signup, login, and landing pages."""
     try:
-        result = generate_application_with_llm(
+        result = await run_in_threadpool(
+            generate_application_with_llm,
             request.description,
             request.css_framework,
             request.frontend_framework,
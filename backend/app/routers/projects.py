@@ -11,6 +11,7 @@ import re
 import os
 import subprocess
 import socket
+from functools import lru_cache
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -206,6 +207,9 @@ def update_project(
                     )
                     update_data['application_url'] = result['application_url']
                     logger.info(f"Generated application for project {project.id}: {result['application_url']}")
+                    # A renamed project is generated into a new project_<id>_<name> directory
+                    from app.routers.ai_assistant import forget_project_dir
+                    forget_project_dir(project.id)
             except Exception as e:
                 logger.error(f"Error generating application code: {str(e)}")
                 # Don't fail the save if code generation fails
@@ -422,6 +426,8 @@ def delete_project(
     
     # Delete generated application files if they exist
     try:
+        from app.routers.ai_assistant import forget_project_dir
+        forget_project_dir(project_id)
         delete_generated_app(project_id, project_name)
         logger.info(f"Deleted generated app for project {project_id} ({project_name})")
     except Exception as e:
@@ -486,8 +492,13 @@ def update_docker_compose_ports(project_dir: Path, frontend_port: int, backend_p
     except Exception as e:
         logger.error(f"Error updating docker-compose.yml: {e}")
 
+@lru_cache(maxsize=1)
 def get_docker_compose_cmd():
-    """Get the docker compose command (supports both 'docker-compose' and 'docker compose')."""
+    """Get the docker compose command (supports both 'docker-compose' and 'docker compose').
+
+    The probe result is cached for the life of the process; a failed probe
+    raises and is retried on the next call. Callers must not mutate the list.
+    """
     try:
         # Try 'docker compose' first (newer version)
         result = subprocess.run(['docker', 'compose', 'version'], capture_output=True, timeout=5)
@@ -0,0 +1,20 @@
+"""
+Shared HTTP session for calls to Ollama (and any other HTTP backend).
+
+Module-level requests.get/post open a new TCP connection per call. Going through
+one pooled session keeps connections alive between LLM calls, retries and the
+parallel MCP model queries.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Large enough for MCP's parallel queries plus concurrent requests from the threadpool.
+# Retries are done by the callers (with backoff), not by urllib3.
+_POOL_CONNECTIONS = 32
+_POOL_MAXSIZE = 64
+
+http_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=_POOL_CONNECTIONS, pool_maxsize=_POOL_MAXSIZE, max_retries=0)
+http_session.mount("http://", _adapter)
+http_session.mount("https://", _adapter)
@@ -0,0 +1,68 @@
+"""
+In-memory cache of LLM responses, keyed on the exact request.
+
+Code generation goes to Ollama at a low temperature, so the same prompt to the same
+model yields an equivalent answer. Repeated prompts ("create a signup form") are served
+from here instead of another multi-second LLM round trip.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Only near-deterministic requests are worth caching; higher temperatures are asked
+# for because the caller wants a different answer each time
+MAX_CACHEABLE_TEMPERATURE = 0.3
+
+# key -> (timestamp, response), least recently used first
+_llm_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+_llm_cache_lock = threading.Lock()
+
+
+def llm_cache_key(**request: Any) -> str:
+    """Stable key for an LLM request (model, prompts, sampling options, ...)."""
+    encoded = json.dumps(request, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def get_cached_response(key: str) -> Optional[str]:
+    """Cached response for key, or None if missing, expired or caching is disabled."""
+    from app.services.settings_loader import get_llm_cache_ttl
+    ttl = get_llm_cache_ttl()
+    if ttl <= 0:
+        return None
+    with _llm_cache_lock:
+        entry = _llm_cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > ttl:
+            del _llm_cache[key]
+            return None
+        _llm_cache.move_to_end(key)
+        logger.info("Using cached LLM response")
+        return entry[1]
+
+
+def cache_response(key: str, response: str) -> None:
+    """Store a non-empty response, evicting the least recently used entries."""
+    from app.services.settings_loader import get_llm_cache_ttl, get_llm_cache_max_entries
+    if not response or get_llm_cache_ttl() <= 0:
+        return
+    max_entries = get_llm_cache_max_entries()
+    with _llm_cache_lock:
+        _llm_cache[key] = (time.time(), response)
+        _llm_cache.move_to_end(key)
+        while len(_llm_cache) > max_entries:
+            _llm_cache.popitem(last=False)
+
+
+def clear_llm_cache() -> None:
+    """Drop all cached responses (e.g. after switching models)."""
+    with _llm_cache_lock:
+        _llm_cache.clear()
@@ -12,6 +12,8 @@ from typing import List, Dict, Optional, Any, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 
+from app.services.http_client import http_session
+
 logger = logging.getLogger(__name__)
 
 
@@ -51,7 +53,7 @@ class MCPServer:
         Get list of available Ollama models from the server.
         """
         try:
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=5)
+            response = http_session.get(f"{self.ollama_url}/api/tags", timeout=5)
             if response.status_code == 200:
                 data = response.json()
                 models = [model.get("name", "") for model in data.get("models", [])]
@@ -109,7 +111,7 @@ class MCPServer:
             if system_prompt:
                 payload["system"] = system_prompt
             
-            response = requests.post(
+            response = http_session.post(
                 f"{self.ollama_url}/api/generate",
                 json=payload,
                 timeout=timeout
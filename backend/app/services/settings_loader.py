@@ -134,10 +134,26 @@ def get_ollama_model() -> Optional[str]:
     """Get OLLAMA_MODEL from database or environment."""
     return get_setting("OLLAMA_MODEL")
 
+def get_ollama_fast_model() -> Optional[str]:
+    """Get OLLAMA_FAST_MODEL (smaller model for simple errors; unset disables routing) from database or environment."""
+    return get_setting("OLLAMA_FAST_MODEL")
+
 def get_ollama_timeout() -> int:
     """Get OLLAMA_TIMEOUT from database or environment."""
     return get_setting_int("OLLAMA_TIMEOUT", 120)
 
+def get_ollama_keep_alive() -> Optional[str]:
+    """Get OLLAMA_KEEP_ALIVE (e.g. "30m", "-1"; empty uses Ollama's default) from database or environment."""
+    return get_setting("OLLAMA_KEEP_ALIVE", "30m")
+
+def get_llm_cache_ttl() -> int:
+    """Get LLM_CACHE_TTL (seconds a cached LLM response stays valid; 0 disables the cache) from database or environment."""
+    return get_setting_int("LLM_CACHE_TTL", 3600)
+
+def get_llm_cache_max_entries() -> int:
+    """Get LLM_CACHE_MAX_ENTRIES from database or environment."""
+    return max(1, get_setting_int("LLM_CACHE_MAX_ENTRIES", 1024))
+
 def get_base_url() -> str:
     """Get BASE_URL from database or environment."""
     return get_setting("BASE_URL", "http://localhost")
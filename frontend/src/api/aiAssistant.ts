@@ -59,6 +59,14 @@ export interface DebugResponse {
   fix_applied: boolean
   docker_rebuilt: boolean
   application_url?: string
+  rebuild_job_id?: string
+}
+
+export interface RebuildStatus {
+  status: 'pending' | 'running' | 'done' | 'failed'
+  docker_rebuilt: boolean
+  error?: string
+  application_url?: string
 }
 
 export interface FormAPIRequest {
@@ -101,6 +109,21 @@ export const aiAssistantAPI = {
     const response = await api.post<DebugResponse>('/ai/debug-fix', request)
     return response.data
   },
+  debugFixStatus: async (jobId: string): Promise<RebuildStatus> => {
+    const response = await api.get<RebuildStatus>(`/ai/debug-fix/status/${jobId}`)
+    return response.data
+  },
+  // Docker rebuilds after a debug fix run in the background; poll until it finishes
+  waitForRebuild: async (jobId: string, intervalMs = 3000, timeoutMs = 10 * 60 * 1000): Promise<RebuildStatus> => {
+    const deadline = Date.now() + timeoutMs
+    for (;;) {
+      const rebuild = await aiAssistantAPI.debugFixStatus(jobId)
+      if (rebuild.status === 'done' || rebuild.status === 'failed' || Date.now() > deadline) {
+        return rebuild
+      }
+      await new Promise(resolve => setTimeout(resolve, intervalMs))
+    }
+  },
   generateFormAPI: async (request: FormAPIRequest): Promise<FormAPIResponse> => {
     const response = await api.post<FormAPIResponse>('/ai/generate-form-api', request)
     return response.data
@@ -387,17 +387,41 @@ const MovableAIPromptBox: React.FC<MovableAIPromptBoxProps> = ({
           responseMessage += `\n\n✅ **Fix Applied Successfully!**`
         }
         
-        if (response.docker_rebuilt) {
-          responseMessage += `\n\n🐳 **Docker Containers Rebuilt!**`
-          if (response.application_url) {
-            responseMessage += `\n\n🔗 Application URL: ${response.application_url}`
-            // Reload the page after a short delay
-            setTimeout(() => {
-              if (response.application_url) {
-                window.open(response.application_url, '_blank', 'noopener,noreferrer')
+        if (response.rebuild_job_id) {
+          responseMessage += `\n\n🐳 **Rebuilding Docker containers...**`
+          // The rebuild can take minutes; report it in a follow-up message when it finishes
+          aiAssistantAPI.waitForRebuild(response.rebuild_job_id)
+            .then(rebuild => {
+              let rebuildMessage: string
+              if (rebuild.docker_rebuilt) {
+                rebuildMessage = `🐳 **Docker Containers Rebuilt!**`
+                if (rebuild.application_url) {
+                  rebuildMessage += `\n\n🔗 Application URL: ${rebuild.application_url}`
+                  // Open the application after a short delay
+                  setTimeout(() => {
+                    if (rebuild.application_url) {
+                      window.open(rebuild.application_url, '_blank', 'noopener,noreferrer')
+                    }
+                  }, 2000)
+                }
+              } else if (rebuild.status === 'failed') {
+                rebuildMessage = `⚠️ **Docker rebuild failed:**\n\`\`\`\n${rebuild.error || 'Unknown error'}\n\`\`\``
+              } else {
+                rebuildMessage = `⏳ Docker rebuild is still running - check the application again in a few minutes.`
               }
-            }, 2000)
-          }
+              setChatHistory(prev => [...prev, {
+                type: 'assistant',
+                content: rebuildMessage,
+                timestamp: new Date()
+              }])
+            })
+            .catch(() => {
+              setChatHistory(prev => [...prev, {
+                type: 'assistant',
+                content: `⚠️ Could not get the Docker rebuild status.`,
+                timestamp: new Date()
+              }])
+            })
         }
         
         setChatHistory(prev => [...prev, {